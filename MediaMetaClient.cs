@@ -0,0 +1,57 @@
+using System.Net.Sockets;
+using System.Text;
+using System.Text.Json;
+
+namespace LschannelFun;
+
+/// <summary>
+/// Client for the media metadata service (wwwroot/multimedia/media_meta.py serve) on a Unix socket.
+/// Looks up the durations of a batch of files in one round trip; returns null when the service is
+/// not running or does not answer in time, so callers fall back to ffprobe.
+/// </summary>
+public class MediaMetaClient
+{
+    private static readonly TimeSpan Timeout = TimeSpan.FromSeconds(5);
+    private readonly string _socketPath;
+
+    public MediaMetaClient(string socketPath)
+    {
+        _socketPath = socketPath;
+    }
+
+    /// <summary>
+    /// Duration in seconds per absolute path, for the files the service could read.
+    /// </summary>
+    public async Task<Dictionary<string, double>?> GetDurationsAsync(IReadOnlyList<string> paths)
+    {
+        if (paths.Count == 0)
+            return new Dictionary<string, double>();
+        try
+        {
+            using var cts = new CancellationTokenSource(Timeout);
+            using var socket = new Socket(AddressFamily.Unix, SocketType.Stream, ProtocolType.Unspecified);
+            await socket.ConnectAsync(new UnixDomainSocketEndPoint(_socketPath), cts.Token);
+            await using var stream = new NetworkStream(socket);
+            var request = JsonSerializer.Serialize(new { id = 1, op = "get", paths }) + "\n";
+            await stream.WriteAsync(Encoding.UTF8.GetBytes(request), cts.Token);
+            using var reader = new StreamReader(stream, Encoding.UTF8);
+            var line = await reader.ReadLineAsync(cts.Token);
+            if (line == null)
+                return null;
+            using var doc = JsonDocument.Parse(line);
+            var response = doc.RootElement;
+            if (!response.TryGetProperty("ok", out var ok) || ok.ValueKind != JsonValueKind.True)
+                return null;
+            var durations = new Dictionary<string, double>();
+            foreach (var file in response.GetProperty("result").EnumerateObject())
+                if (file.Value.ValueKind == JsonValueKind.Object &&
+                    file.Value.TryGetProperty("duration", out var d) && d.ValueKind == JsonValueKind.Number)
+                    durations[file.Name] = d.GetDouble();
+            return durations;
+        }
+        catch (Exception)
+        {
+            return null;
+        }
+    }
+}
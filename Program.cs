@@ -25,6 +25,12 @@ builder.Services.AddSingleton(sp =>
     return new ReloadableFileCache(Path.Combine(env.ContentRootPath, "wwwroot"));
 });
 builder.Services.AddHostedService<ReloadCacheHostedService>();
+builder.Services.AddSingleton(sp =>
+{
+    var env = sp.GetRequiredService<IWebHostEnvironment>();
+    var socketPath = Environment.GetEnvironmentVariable("MEDIA_META_SOCKET");
+    return new MediaMetaClient(string.IsNullOrEmpty(socketPath) ? Path.Combine(env.ContentRootPath, ".cache", "media_meta.sock") : socketPath);
+});
 
 var app = builder.Build();
 
@@ -155,8 +161,22 @@ app.MapPost("/api/manager/reload-cache", (HttpContext context) =>
     return Results.Json(new { success = true, message = "Cache cleared; db.json and web pages will be reloaded on next request." });
 });
 
+// Rebuild a db.json entry: filename (and durationInSeconds for videos) come from the refresh, every other
+// field (cover, chapters, textAsCover, coverOffet, trim/loudness values, ...) is kept from the existing entry
+static Dictionary<string, object?> RefreshedEntry(JsonElement? existing, string filename, int? durationSec = null)
+{
+    var entry = new Dictionary<string, object?> { ["filename"] = filename };
+    if (durationSec is int seconds)
+        entry["durationInSeconds"] = seconds.ToString();
+    if (existing is JsonElement e && e.ValueKind == JsonValueKind.Object)
+        foreach (var prop in e.EnumerateObject())
+            if (!entry.ContainsKey(prop.Name))
+                entry[prop.Name] = prop.Value.Clone();
+    return entry;
+}
+
 // 6) Manager API: refresh data
-app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string type) =>
+app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string type, MediaMetaClient mediaMeta) =>
 {
     var auth = context.Request.Headers.Authorization.ToString();
     if (!auth.StartsWith("Bearer "))
@@ -194,9 +214,14 @@ app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string ty
                 }
                 var list = new List<object>();
                 var videoExtensions = new[] { ".mp4", ".MP4", ".m4v", ".M4V" };
-                foreach (var videoFile in Directory.GetFiles(videosDir)
+                var videoFiles = Directory.GetFiles(videosDir)
                     .Where(f => videoExtensions.Contains(Path.GetExtension(f)))
-                    .OrderBy(f => f))
+                    .OrderBy(f => f)
+                    .ToList();
+                // Durations of new videos in one query to the metadata service; ffprobe for what it cannot answer
+                var knownDurations = await mediaMeta.GetDurationsAsync(videoFiles.Where(f => !existingDb.ContainsKey(Path.GetFileName(f))).ToList())
+                    ?? new Dictionary<string, double>();
+                foreach (var videoFile in videoFiles)
                 {
                     var fi = new FileInfo(videoFile);
                     var filename = fi.Name;
@@ -206,6 +231,10 @@ app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string ty
                         if (existing.TryGetProperty("durationInSeconds", out var ds) && int.TryParse(ds.GetString(), out var sec))
                             durationSec = sec;
                     }
+                    else if (knownDurations.TryGetValue(videoFile, out var known))
+                    {
+                        durationSec = (int)Math.Round(known);
+                    }
                     else
                     {
                         try
@@ -229,7 +258,7 @@ app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string ty
                         }
                         catch { }
                     }
-                    list.Add(new { filename, durationInSeconds = durationSec.ToString() });
+                    list.Add(RefreshedEntry(existingDb.TryGetValue(filename, out var previous) ? previous : null, filename, durationSec));
                 }
                 var db = new { notes = "Display durationInSeconds in format of xx:xx, like 90secs should be displayed as 01:30", list };
                 await File.WriteAllTextAsync(dbPath, JsonSerializer.Serialize(db, new JsonSerializerOptions { WriteIndented = true, Encoder = System.Text.Encodings.Web.JavaScriptEncoder.UnsafeRelaxedJsonEscaping }));
@@ -260,9 +289,14 @@ app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string ty
             }
             var list = new List<object>();
             var videoExtensions = new[] { ".mp4", ".MP4", ".m4v", ".M4V" };
-            foreach (var videoFile in Directory.GetFiles(videosDir)
+            var videoFiles = Directory.GetFiles(videosDir)
                 .Where(f => videoExtensions.Contains(Path.GetExtension(f)))
-                .OrderBy(f => f))
+                .OrderBy(f => f)
+                .ToList();
+            // Durations of new videos in one query to the metadata service; ffprobe for what it cannot answer
+            var knownDurations = await mediaMeta.GetDurationsAsync(videoFiles.Where(f => !existingDb.ContainsKey(Path.GetFileName(f))).ToList())
+                ?? new Dictionary<string, double>();
+            foreach (var videoFile in videoFiles)
             {
                 var fi = new FileInfo(videoFile);
                 var filename = fi.Name;
@@ -272,6 +306,10 @@ app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string ty
                     if (existing.TryGetProperty("durationInSeconds", out var ds) && int.TryParse(ds.GetString(), out var sec))
                         durationSec = sec;
                 }
+                else if (knownDurations.TryGetValue(videoFile, out var known))
+                {
+                    durationSec = (int)Math.Round(known);
+                }
                 else
                 {
                     try
@@ -295,7 +333,7 @@ app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string ty
                     }
                     catch { }
                 }
-                list.Add(new { filename, durationInSeconds = durationSec.ToString() });
+                list.Add(RefreshedEntry(existingDb.TryGetValue(filename, out var previous) ? previous : null, filename, durationSec));
             }
             var db = new { notes = "Display durationInSeconds in format of xx:xx, like 90secs should be displayed as 01:30", list };
             await File.WriteAllTextAsync(dbPath, JsonSerializer.Serialize(db, new JsonSerializerOptions { WriteIndented = true, Encoder = System.Text.Encodings.Web.JavaScriptEncoder.UnsafeRelaxedJsonEscaping }));
@@ -309,6 +347,20 @@ app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string ty
             var generateCoversScript = Path.Combine(paintingsDir, "generate_covers.py");
             if (!Directory.Exists(imagesDir))
                 return Results.Json(new { success = false, error = "Paintings images folder not found" });
+            // Keep the fields of existing entries (e.g. the content-hashed cover names recorded by generate_covers.py)
+            var existingDb = new Dictionary<string, JsonElement>();
+            if (File.Exists(dbPath))
+            {
+                try
+                {
+                    var existing = JsonSerializer.Deserialize<JsonElement>(await File.ReadAllTextAsync(dbPath));
+                    if (existing.TryGetProperty("list", out var listProp))
+                        foreach (var item in listProp.EnumerateArray())
+                            if (item.TryGetProperty("filename", out var fn))
+                                existingDb[fn.GetString() ?? ""] = item;
+                }
+                catch { }
+            }
             var list = new List<object>();
             var imageExtensions = new[] { ".jpg", ".jpeg", ".png", ".JPG", ".JPEG", ".PNG", ".heic", ".HEIC" };
             foreach (var file in Directory.GetFiles(imagesDir)
@@ -317,7 +369,7 @@ app.MapPost("/api/manager/refresh/{type}", async (HttpContext context, string ty
                 .OrderBy(f => f))
             {
                 var fi = new FileInfo(file);
-                list.Add(new { filename = fi.Name });
+                list.Add(RefreshedEntry(existingDb.TryGetValue(fi.Name, out var previous) ? previous : null, fi.Name));
             }
             var db = new { notes = "Paintings folder - images available for display", list };
             await File.WriteAllTextAsync(dbPath, JsonSerializer.Serialize(db, new JsonSerializerOptions { WriteIndented = true }));
@@ -391,7 +443,8 @@ app.MapGet("/api/downloads", () =>
 });
 
 // 4) Static files (for /images, /multimedia, /en/index.html direct request, etc.)
-// Configure cache headers: db.json files cache for 1 hour, other static files cache longer
+// Configure cache headers: db.json files cache for 1 hour, content-hashed covers forever, other static files cache longer
+var hashedAsset = new System.Text.RegularExpressions.Regex(@"_cover\.[0-9a-f]{8}\.(webp|png|jpg)$", System.Text.RegularExpressions.RegexOptions.Compiled);
 app.UseStaticFiles(new StaticFileOptions
 {
     OnPrepareResponse = ctx =>
@@ -402,6 +455,11 @@ app.UseStaticFiles(new StaticFileOptions
         {
             ctx.Context.Response.Headers.CacheControl = "max-age=3600, must-revalidate";
         }
+        // Covers named by content hash (xxx_cover.<hash8>.webp, see cover_names.py): a new cover gets a new name
+        else if (hashedAsset.IsMatch(path))
+        {
+            ctx.Context.Response.Headers.CacheControl = "public, max-age=31536000, immutable";
+        }
         // Other static files (images, videos, etc.): cache longer
         else
         {
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Check integrity of all media referenced by the db.json files in wwwroot/multimedia.
+
+Replaces the serial existence checks of check_resources.sh. For every
+multimedia/*/db.json (including lsLearns/cn and lsLearns/en) this:
+- verifies referenced media files and their covers exist (thread pool);
+- validates container/image headers cheaply: MP4/M4V/HEIC top-level boxes are
+  walked with seeks only, so truncated uploads are caught without decoding;
+  PNG/JPEG start and end markers are checked;
+- compares db.json sizeMB / durationInSeconds with the actual files
+  (MP4 duration is read from the mvhd box, no ffprobe needed);
+- checks that content-hashed covers ("cover" in db.json, xxx_cover.<hash8>.webp)
+  still match the hash in their name, since they are served as immutable;
+- flags files on disk that no db.json references;
+- optionally compares streaming SHA-256 hashes against a stored manifest.
+
+Output is JSON (default) or a short text summary. Exit code is 1 on errors.
+
+Usage:
+  python3 check_resources.py [base_path] [--manifest FILE] [--write-manifest]
+                             [--format json|text] [--workers N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_BASE = "wwwroot/multimedia"
+
+sys.path.insert(0, str(SCRIPT_DIR / DEFAULT_BASE))  # shared mp4_boxes.py
+from mp4_boxes import iter_boxes
+
+# Sections whose media may live in another section's media folder
+# (same rule the web pages use: en lessons fall back to cn videos).
+FALLBACK_SECTIONS = {"lsLearns/en": "lsLearns/cn"}
+
+# Files that live next to media but are not media themselves
+IGNORED_NAMES = {"db.json", "requirements.txt", "README.md"}
+IGNORED_SUFFIXES = {".py", ".pyc", ".sh", ".md", ".txt"}
+
+# Allowed difference between db.json values and the real files
+SIZE_MB_TOLERANCE = 0.01
+DURATION_TOLERANCE_SEC = 1.0
+
+HASH_CHUNK = 1024 * 1024
+MANIFEST_NAME = "integrity_manifest.json"
+
+MP4_SUFFIXES = {".mp4", ".m4v", ".mov"}
+HEIF_SUFFIXES = {".heic", ".heif"}
+MP4_TOP_LEVEL_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"uuid", b"meta", b"pdin", b"moof", b"mfra", b"styp", b"sidx"}
+# Content-hashed cover names written by the cover scripts (wwwroot/multimedia/cover_names.py)
+HASHED_COVER = re.compile(r"_cover\.([0-9a-f]{8})\.(webp|png|jpg)$")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+# Magic bytes for download files (extension -> prefix)
+DOWNLOAD_MAGIC = {
+    ".pkg": b"xar!",
+    ".zip": b"PK\x03\x04",
+    ".exe": b"MZ",
+}
+
+
+def _read_mvhd_duration(f, moov_start: int, moov_end: int) -> Optional[float]:
+    """Return movie duration in seconds from the mvhd box inside moov, or None."""
+    for box_type, payload, _ in iter_boxes(f, moov_start, moov_end):
+        if box_type != b"mvhd":
+            continue
+        f.seek(payload)
+        version = f.read(1)
+        if not version:
+            return None
+        f.read(3)  # flags
+        if version[0] == 1:
+            data = f.read(28)
+            if len(data) < 28:
+                return None
+            timescale, duration = struct.unpack(">16xIQ", data)
+        else:
+            data = f.read(16)
+            if len(data) < 16:
+                return None
+            timescale, duration = struct.unpack(">8xII", data)
+        return duration / timescale if timescale else None
+    return None
+
+
+def check_mp4(f, size: int) -> tuple[Optional[str], Optional[float]]:
+    """Validate MP4/M4V structure; return (problem, duration_seconds)."""
+    seen = set()
+    duration = None
+    try:
+        for box_type, payload, box_end in iter_boxes(f, 0, size):
+            if not seen and box_type not in MP4_TOP_LEVEL_BOXES:
+                return f"not an MP4 container (first box {box_type!r})", None
+            seen.add(box_type)
+            if box_type == b"moov":
+                duration = _read_mvhd_duration(f, payload, box_end)
+    except ValueError as e:
+        return str(e), None
+    if b"moov" not in seen:
+        return "no moov box (upload incomplete or not faststart-able)", None
+    if b"mdat" not in seen and b"moof" not in seen:
+        return "no mdat box (no media data)", duration
+    return None, duration
+
+
+def check_heif(f, size: int) -> Optional[str]:
+    """Validate HEIC/HEIF: ftyp first and all top-level boxes within the file."""
+    try:
+        for i, (box_type, _, _) in enumerate(iter_boxes(f, 0, size)):
+            if i == 0 and box_type != b"ftyp":
+                return f"not a HEIF file (first box {box_type!r})"
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def check_png(f, size: int) -> Optional[str]:
+    if f.read(8) != PNG_SIGNATURE:
+        return "bad PNG signature"
+    f.seek(max(0, size - len(PNG_IEND)))
+    if f.read(len(PNG_IEND)) != PNG_IEND:
+        return "PNG has no IEND chunk at end (truncated?)"
+    return None
+
+
+def check_webp(f, size: int) -> Optional[str]:
+    head = f.read(12)
+    if head[:4] != b"RIFF" or head[8:12] != b"WEBP":
+        return "bad WebP header"
+    if struct.unpack("<I", head[4:8])[0] + 8 > size:
+        return "WebP shorter than its RIFF size (truncated?)"
+    return None
+
+
+def check_jpeg(f, size: int) -> Optional[str]:
+    if f.read(3) != b"\xff\xd8\xff":
+        return "bad JPEG start marker"
+    # Some cameras pad after EOI, so look at the tail rather than the last 2 bytes
+    tail_len = min(size, 4096)
+    f.seek(size - tail_len)
+    if b"\xff\xd9" not in f.read(tail_len):
+        return "JPEG has no end-of-image marker (truncated?)"
+    return None
+
+
+def inspect_file(path: Path, want_hash: bool) -> dict:
+    """
+    Stat and cheaply validate one file. Runs in a worker thread.
+    Returns dict with keys: exists, size, problem, duration, sha256.
+    """
+    result = {"exists": False, "size": None, "problem": None, "duration": None, "sha256": None}
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return result
+    result["exists"] = True
+    result["size"] = size
+    suffix = path.suffix.lower()
+    try:
+        with open(path, "rb") as f:
+            if size == 0:
+                result["problem"] = "empty file"
+            elif suffix in MP4_SUFFIXES:
+                result["problem"], result["duration"] = check_mp4(f, size)
+            elif suffix in HEIF_SUFFIXES:
+                result["problem"] = check_heif(f, size)
+            elif suffix == ".png":
+                result["problem"] = check_png(f, size)
+            elif suffix in {".jpg", ".jpeg"}:
+                result["problem"] = check_jpeg(f, size)
+            elif suffix == ".webp":
+                result["problem"] = check_webp(f, size)
+            elif suffix in DOWNLOAD_MAGIC:
+                magic = DOWNLOAD_MAGIC[suffix]
+                if f.read(len(magic)) != magic:
+                    result["problem"] = f"bad {suffix} header"
+            if want_hash:
+                f.seek(0)
+                h = hashlib.sha256()
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                    h.update(chunk)
+                result["sha256"] = h.hexdigest()
+    except OSError as e:
+        result["problem"] = f"read error: {e}"
+    return result
+
+
+def _is_media_candidate(p: Path) -> bool:
+    return (
+        p.is_file()
+        and not p.name.startswith(".")
+        and p.name not in IGNORED_NAMES
+        and p.suffix.lower() not in IGNORED_SUFFIXES
+    )
+
+
+def load_sections(base_dir: Path) -> tuple[list[dict], list[dict]]:
+    """
+    Find every db.json under base_dir (one and two levels deep) and describe it.
+    Returns (sections, issues) where issues holds unreadable db.json files.
+    """
+    sections = []
+    issues = []
+    db_files = sorted(base_dir.glob("*/db.json")) + sorted(base_dir.glob("*/*/db.json"))
+    for db_path in db_files:
+        folder = db_path.parent
+        name = folder.relative_to(base_dir).as_posix()
+        try:
+            with open(db_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            issues.append({"severity": "error", "code": "db-invalid", "path": name + "/db.json", "detail": str(e)})
+            continue
+        if (folder / "videos").is_dir():
+            media_dir = folder / "videos"
+        elif (folder / "images").is_dir():
+            media_dir = folder / "images"
+        else:
+            media_dir = folder
+        cover_dir = folder / "covers_generated"
+        sections.append({
+            "name": name,
+            "db_path": db_path,
+            "media_dir": media_dir,
+            "cover_dir": cover_dir if cover_dir.is_dir() or media_dir is not folder else None,
+            "entries": [e for e in data.get("list", []) if isinstance(e, dict) and e.get("filename")],
+        })
+    return sections, issues
+
+
+def run_checks(base_dir: Path, manifest: Optional[dict], want_hash: bool, workers: int) -> dict:
+    started = time.monotonic()
+    sections, issues = load_sections(base_dir)
+    by_name = {s["name"]: s for s in sections}
+
+    def rel(p: Path) -> str:
+        return p.relative_to(base_dir).as_posix()
+
+    def add(severity: str, code: str, path: str, db: str, detail: str = "") -> None:
+        issues.append({"severity": severity, "code": code, "path": path, "db": db, "detail": detail})
+
+    # Resolve every reference to a concrete path first, then inspect all of them in parallel
+    refs = []  # (section, entry, kind, path, fell_back)
+    known = set()  # on disk for a reason, though no page loads them
+    for s in sections:
+        for entry in s["entries"]:
+            filename = entry["filename"]
+            path = s["media_dir"] / filename
+            fell_back = False
+            fallback = by_name.get(FALLBACK_SECTIONS.get(s["name"], ""))
+            if not path.is_file() and fallback is not None and (fallback["media_dir"] / filename).is_file():
+                path = fallback["media_dir"] / filename
+                fell_back = True
+            refs.append((s, entry, "media", path, fell_back))
+            if s["cover_dir"] is not None:
+                plain = s["cover_dir"] / (Path(filename).stem + "_cover.png")
+                if entry.get("cover"):
+                    # The page loads the hashed cover; the plain one is the generators' working copy
+                    refs.append((s, entry, "cover", s["cover_dir"] / entry["cover"], False))
+                    known.add(plain)
+                else:
+                    refs.append((s, entry, "cover", plain, False))
+
+    referenced = {r[3] for r in refs}
+    unreferenced = []
+    for s in sections:
+        for d in (s["media_dir"], s["cover_dir"]):
+            if d is None or not d.is_dir():
+                continue
+            unreferenced.extend(p for p in sorted(d.iterdir()) if _is_media_candidate(p) and p not in referenced and p not in known)
+
+    # Unreferenced files are inspected too so the manifest can cover everything on disk
+    all_paths = sorted(referenced | set(unreferenced))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(all_paths, pool.map(lambda p: inspect_file(p, want_hash), all_paths)))
+
+    for s, entry, kind, path, fell_back in refs:
+        db = rel(s["db_path"])
+        info = results[path]
+        if not info["exists"]:
+            if kind == "cover":
+                add("warning", "missing-cover", rel(path), db)
+            else:
+                add("error", "missing", rel(path), db)
+            continue
+        if fell_back:
+            add("warning", "fallback", rel(path), db, f"not in {rel(s['media_dir'])}/, using {FALLBACK_SECTIONS[s['name']]}")
+        if info["problem"]:
+            add("error", "corrupt", rel(path), db, info["problem"])
+        if kind != "media":
+            hashed = HASHED_COVER.search(path.name)
+            if hashed and not info["problem"]:
+                digest = info["sha256"] or inspect_file(path, True)["sha256"]
+                if digest and not digest.startswith(hashed.group(1)):
+                    add("error", "cover-hash-mismatch", rel(path), db,
+                        f"content hash {digest[:8]} does not match the name; browsers cache this file as immutable")
+            continue
+        if "sizeMB" in entry:
+            try:
+                declared = float(entry["sizeMB"])
+                actual = info["size"] / (1024 * 1024)
+                if abs(declared - actual) > SIZE_MB_TOLERANCE:
+                    add("error", "size-mismatch", rel(path), db, f"db.json sizeMB={entry['sizeMB']}, actual {actual:.2f}")
+            except (TypeError, ValueError):
+                add("warning", "size-mismatch", rel(path), db, f"unparseable sizeMB {entry['sizeMB']!r}")
+        if "durationInSeconds" in entry and info["duration"] is not None:
+            try:
+                declared = float(entry["durationInSeconds"])
+                if abs(declared - info["duration"]) > DURATION_TOLERANCE_SEC:
+                    add("warning", "duration-mismatch", rel(path), db,
+                        f"db.json durationInSeconds={entry['durationInSeconds']}, actual {info['duration']:.1f}")
+            except (TypeError, ValueError):
+                add("warning", "duration-mismatch", rel(path), db, f"unparseable durationInSeconds {entry['durationInSeconds']!r}")
+
+    for path in unreferenced:
+        if HASHED_COVER.search(path.name):
+            add("warning", "unreferenced", rel(path), "", "superseded cover version; the cover scripts delete it after the grace period")
+        else:
+            add("warning", "unreferenced", rel(path), "", "not referenced by any db.json")
+        if results[path]["problem"]:
+            add("error", "corrupt", rel(path), "", results[path]["problem"])
+
+    hashes = {rel(p): {"size": info["size"], "sha256": info["sha256"]}
+              for p, info in results.items() if info["exists"] and info["sha256"]}
+    if manifest is not None:
+        for key, info in hashes.items():
+            expected = manifest.get(key)
+            if expected is None:
+                add("warning", "not-in-manifest", key, "")
+            elif expected.get("sha256") != info["sha256"]:
+                add("error", "hash-mismatch", key, "", f"expected {expected.get('sha256')}, got {info['sha256']}")
+
+    errors = sum(1 for i in issues if i["severity"] == "error")
+    return {
+        "base": str(base_dir),
+        "elapsedSeconds": round(time.monotonic() - started, 3),
+        "summary": {
+            "databases": len(sections),
+            "references": len(refs),
+            "filesChecked": sum(1 for info in results.values() if info["exists"]),
+            "bytesChecked": sum(info["size"] or 0 for info in results.values()),
+            "hashed": len(hashes),
+            "errors": errors,
+            "warnings": len(issues) - errors,
+        },
+        "issues": issues,
+        "hashes": hashes,
+    }
+
+
+def print_text(report: dict) -> None:
+    labels = {"error": "✗", "warning": "⚠"}
+    for i in report["issues"]:
+        where = f" (referenced in {i['db']})" if i.get("db") else ""
+        detail = f": {i['detail']}" if i.get("detail") else ""
+        print(f"{labels[i['severity']]} {i['code'].upper()} {i['path']}{where}{detail}")
+    s = report["summary"]
+    print("==================================")
+    print(f"Checked {s['filesChecked']} files ({s['bytesChecked'] / (1024 * 1024):.1f} MB) "
+          f"from {s['databases']} db.json in {report['elapsedSeconds']:.2f}s")
+    print(f"  Errors: {s['errors']}")
+    print(f"  Warnings: {s['warnings']}")
+    print("✓ All required files are present and intact." if s["errors"] == 0 else "✗ Problems found!")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parallel integrity check of media referenced by db.json files.")
+    ap.add_argument("base_path", nargs="?", default=DEFAULT_BASE,
+                    help=f"multimedia folder, relative to this script (default {DEFAULT_BASE})")
+    ap.add_argument("--manifest", help=f"SHA-256 manifest to compare against (default {MANIFEST_NAME} next to this script, if it exists)")
+    ap.add_argument("--write-manifest", action="store_true", help="Hash all files and (re)write the manifest.")
+    ap.add_argument("--hash", action="store_true", help="Compute SHA-256 even without a manifest.")
+    ap.add_argument("--format", choices=["json", "text"], default="json")
+    ap.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4))
+    args = ap.parse_args()
+
+    base_dir = (SCRIPT_DIR / args.base_path).resolve()
+    if not base_dir.is_dir():
+        print(f"Error: Directory {base_dir} does not exist", file=sys.stderr)
+        sys.exit(2)
+
+    manifest_path = Path(args.manifest) if args.manifest else SCRIPT_DIR / MANIFEST_NAME
+    manifest = None
+    if not args.write_manifest and manifest_path.is_file():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f).get("files", {})
+    want_hash = args.hash or args.write_manifest or manifest is not None
+
+    report = run_checks(base_dir, manifest, want_hash, max(1, args.workers))
+
+    if args.write_manifest:
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"files": report["hashes"]}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        report["manifestWritten"] = str(manifest_path)
+
+    if args.format == "text":
+        print_text(report)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    sys.exit(1 if report["summary"]["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+Replay realistic page-view traffic against the site and report latency,
+throughput and bytes per page view.
+
+Page views are built from the actual wwwroot/multimedia db.json files and
+follow what cn/index.html and en/index.html request:
+- the locale page (/cn/ or /en/) and the avatar;
+- one tab's db.json (lessons cn/en, paintings, music or downloads);
+- every cover of that tab (lessons with textAsCover have none);
+- with probability --play-rate, opening one item: two MP4 range requests
+  (start of file, then a seek) for lessons/music, the full image for paintings.
+
+Each virtual user (--users) runs page views one after another over at most
+BROWSER_CONNECTIONS keep-alive connections, like a browser. With --returning,
+that fraction of page views reuse the user's HTTP cache: fresh entries
+(Cache-Control max-age) are not requested at all, stale ones are revalidated
+with If-None-Match / If-Modified-Since. This is what cover format and caching
+changes should be judged by.
+
+Targets: a running server (--url http://127.0.0.1:5000, Kestrel or nginx), or
+--serve for a bundled stdlib stand-in that mirrors Program.cs (locale pages,
+static files with the same Cache-Control rules, ETag/304, single byte ranges).
+
+Usage:
+  python3 load_replay.py --serve --users 20 --page-views 500
+  python3 load_replay.py --url http://127.0.0.1:5000 --returning 0.5 --format json
+"""
+import argparse
+import asyncio
+import email.utils
+import json
+import mimetypes
+import os
+import random
+import re
+import sys
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+WEB_ROOT = SCRIPT_DIR / "wwwroot"
+MULTIMEDIA = WEB_ROOT / "multimedia"
+
+BROWSER_CONNECTIONS = 6          # per-host HTTP/1.1 connection limit of browsers
+VIDEO_RANGE_BYTES = 1024 * 1024  # bytes fetched per MP4 range request
+READ_CHUNK = 64 * 1024
+TABS = ("lessons", "paintings", "music", "downloads")
+
+
+# ---- request mix ------------------------------------------------------------
+
+def _load_list(rel: str) -> list[dict]:
+    try:
+        with open(MULTIMEDIA / rel / "db.json", "r", encoding="utf-8") as f:
+            return [e for e in json.load(f).get("list", []) if isinstance(e, dict) and e.get("filename")]
+    except (OSError, ValueError):
+        return []
+
+
+def _url(*parts: str) -> str:
+    return "/" + "/".join(urllib.parse.quote(p) for p in parts)
+
+
+def _cover(section: str, item: dict) -> str:
+    # Same as the pages: the content-hashed "cover" when db.json records one
+    name = item.get("cover") or os.path.splitext(item["filename"])[0] + "_cover.png"
+    return _url("multimedia", *section.split("/"), "covers_generated", name)
+
+
+class RequestMix:
+    """Page-view request lists built from the db.json files."""
+
+    def __init__(self):
+        self.lists = {rel: _load_list(rel) for rel in ("lsLearns/cn", "lsLearns/en", "paintings", "music", "downloads")}
+        self.sizes = {}
+
+    def _size(self, url: str) -> int:
+        if url not in self.sizes:
+            path = WEB_ROOT / urllib.parse.unquote(url).lstrip("/")
+            self.sizes[url] = path.stat().st_size if path.is_file() else 0
+        return self.sizes[url]
+
+    def _video(self, lang: str, item: dict) -> str:
+        own = _url("multimedia", "lsLearns", lang, "videos", item["filename"])
+        if lang != "cn" and not self._size(own):
+            return _url("multimedia", "lsLearns", "cn", "videos", item["filename"])  # same fallback as en/index.html
+        return own
+
+    def page_view(self, rng: random.Random, play_rate: float) -> list[tuple[str, str, Optional[tuple[int, int]]]]:
+        """[(kind, url, byte_range or None)], in the order the page issues them."""
+        lang = rng.choice(("cn", "en"))
+        tab = rng.choice(TABS)
+        requests = [("html", f"/{lang}/", None), ("image", "/images/avatar.JPG", None)]
+        section = f"lsLearns/{lang}" if tab == "lessons" else tab
+        items = self.lists[section]
+        requests.append(("db", _url("multimedia", *section.split("/"), "db.json"), None))
+        if tab != "downloads":
+            requests += [("cover", _cover(section, it), None) for it in items
+                         if not (tab == "lessons" and it.get("textAsCover"))]
+        if items and tab != "downloads" and rng.random() < play_rate:
+            item = rng.choice(items)
+            if tab == "paintings":
+                requests.append(("image", _url("multimedia", "paintings", "images", item["filename"]), None))
+            else:
+                url = self._video(lang, item) if tab == "lessons" else _url("multimedia", "music", "videos", item["filename"])
+                size = self._size(url)
+                requests.append(("video-range", url, (0, VIDEO_RANGE_BYTES - 1)))
+                if size > 2 * VIDEO_RANGE_BYTES:
+                    start = rng.randrange(VIDEO_RANGE_BYTES, size - VIDEO_RANGE_BYTES)
+                    requests.append(("video-range", url, (start, start + VIDEO_RANGE_BYTES - 1)))
+        return requests
+
+
+# ---- HTTP/1.1 client --------------------------------------------------------
+
+class Response:
+    __slots__ = ("status", "headers", "bytes")
+
+    def __init__(self, status: int, headers: dict, nbytes: int):
+        self.status = status
+        self.headers = headers
+        self.bytes = nbytes
+
+
+async def _read_head(reader) -> tuple[int, dict, int]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    return status, headers, len(head)
+
+
+async def _drain_body(reader, headers: dict, status: int, method: str) -> int:
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        return 0
+    total = 0
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            size = int(size_line.split(b";")[0], 16)
+            total += len(size_line)
+            if size == 0:
+                total += len(await reader.readuntil(b"\r\n"))
+                return total
+            await reader.readexactly(size + 2)
+            total += size + 2
+    remaining = int(headers.get("content-length", "0"))
+    while remaining > 0:
+        chunk = await reader.read(min(READ_CHUNK, remaining))
+        if not chunk:
+            raise ConnectionError("connection closed mid-body")
+        remaining -= len(chunk)
+        total += len(chunk)
+    return total
+
+
+class ConnectionPool:
+    """Keep-alive connections of one virtual browser, at most BROWSER_CONNECTIONS at a time."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._idle = []
+        self._slots = asyncio.Semaphore(BROWSER_CONNECTIONS)
+
+    async def request(self, path: str, headers: dict) -> Response:
+        async with self._slots:
+            for attempt in (0, 1):
+                reused = bool(self._idle)
+                reader, writer = self._idle.pop() if reused else await asyncio.open_connection(self.host, self.port)
+                try:
+                    lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+                    lines += [f"{k}: {v}" for k, v in headers.items()]
+                    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+                    await writer.drain()
+                    status, resp_headers, head_bytes = await _read_head(reader)
+                    body_bytes = await _drain_body(reader, resp_headers, status, "GET")
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue  # server closed an idle keep-alive connection; retry on a fresh one
+                    raise
+                if resp_headers.get("connection", "").lower() == "close":
+                    writer.close()
+                else:
+                    self._idle.append((reader, writer))
+                return Response(status, resp_headers, head_bytes + body_bytes)
+
+    def close(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+# ---- browser cache ------------------------------------------------------------
+
+def _max_age(cache_control: str) -> Optional[int]:
+    for part in cache_control.split(","):
+        part = part.strip().lower()
+        if part.startswith("max-age="):
+            try:
+                return int(part[8:])
+            except ValueError:
+                return None
+    return None
+
+
+class BrowserCache:
+    """Enough of an HTTP cache to model returning visitors (freshness + validators)."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def lookup(self, url: str, now: float) -> tuple[bool, dict]:
+        """(fresh, conditional headers)."""
+        entry = self.entries.get(url)
+        if entry is None:
+            return False, {}
+        if entry["expires"] > now:
+            return True, {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return False, headers
+
+    def store(self, url: str, resp: Response, now: float) -> None:
+        if resp.status == 304 and url in self.entries:
+            age = _max_age(resp.headers.get("cache-control", ""))
+            self.entries[url]["expires"] = now + (age or 0)
+            return
+        if resp.status != 200:
+            return
+        cc = resp.headers.get("cache-control", "")
+        if "no-store" in cc.lower():
+            return
+        self.entries[url] = {
+            "expires": now + (_max_age(cc) or 0),
+            "etag": resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+        }
+
+
+# ---- replay ---------------------------------------------------------------------
+
+class Stats:
+    def __init__(self):
+        self.requests = {}   # kind -> [latency seconds]
+        self.statuses = {}
+        self.errors = 0
+        self.cache_hits = 0
+        self.bytes = 0
+        self.pages = []      # (seconds, bytes, requests)
+
+    def add(self, kind: str, seconds: float, resp: Optional[Response]) -> None:
+        if resp is None:
+            self.errors += 1
+            return
+        self.requests.setdefault(kind, []).append(seconds)
+        self.statuses[resp.status] = self.statuses.get(resp.status, 0) + 1
+        self.bytes += resp.bytes
+
+
+async def _page_view(pool: ConnectionPool, cache: BrowserCache, requests: list, stats: Stats) -> None:
+    started = time.monotonic()
+    page = {"bytes": 0, "requests": 0}
+
+    async def one(kind, url, byte_range):
+        headers = {"Accept-Encoding": "identity"}
+        if byte_range is None:
+            fresh, conditional = cache.lookup(url, time.time())
+            if fresh:
+                stats.cache_hits += 1
+                return
+            headers.update(conditional)
+        else:
+            headers["Range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+        t0 = time.monotonic()
+        try:
+            resp = await pool.request(url, headers)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            stats.add(kind, 0.0, None)
+            return
+        stats.add(kind, time.monotonic() - t0, resp)
+        page["bytes"] += resp.bytes
+        page["requests"] += 1
+        if byte_range is None:
+            cache.store(url, resp, time.time())
+
+    await asyncio.gather(*(one(*r) for r in requests))
+    stats.pages.append((time.monotonic() - started, page["bytes"], page["requests"]))
+
+
+async def replay(host: str, port: int, users: int, page_views: int, play_rate: float,
+                 returning: float, seed: int) -> tuple[Stats, float]:
+    mix = RequestMix()
+    stats = Stats()
+    rng = random.Random(seed)
+    plans = [(mix.page_view(rng, play_rate), rng.random() < returning) for _ in range(page_views)]
+    queue = asyncio.Queue()
+    for plan in plans:
+        queue.put_nowait(plan)
+
+    async def user():
+        pool = ConnectionPool(host, port)
+        cache = BrowserCache()
+        try:
+            while True:
+                try:
+                    requests, is_returning = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if not is_returning:
+                    # New visitor: empty cache and fresh connections
+                    cache = BrowserCache()
+                    pool.close()
+                await _page_view(pool, cache, requests, stats)
+        finally:
+            pool.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(user() for _ in range(max(1, users))))
+    return stats, time.monotonic() - started
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def _summary(values: list) -> dict:
+    v = sorted(values)
+    return {
+        "count": len(v),
+        "p50_ms": round(_percentile(v, 50) * 1000, 1),
+        "p95_ms": round(_percentile(v, 95) * 1000, 1),
+        "p99_ms": round(_percentile(v, 99) * 1000, 1),
+    }
+
+
+def build_report(stats: Stats, elapsed: float) -> dict:
+    all_latencies = [x for v in stats.requests.values() for x in v]
+    n_requests = len(all_latencies)
+    n_pages = len(stats.pages)
+    return {
+        "elapsedSeconds": round(elapsed, 2),
+        "pageViews": n_pages,
+        "requests": n_requests,
+        "errors": stats.errors,
+        "cacheHits": stats.cache_hits,
+        "statuses": {str(k): v for k, v in sorted(stats.statuses.items())},
+        "throughput": {
+            "pageViewsPerSecond": round(n_pages / elapsed, 2) if elapsed else 0,
+            "requestsPerSecond": round(n_requests / elapsed, 1) if elapsed else 0,
+            "megabytesPerSecond": round(stats.bytes / elapsed / 1048576, 2) if elapsed else 0,
+        },
+        "perPageView": {
+            "bytes": round(sum(p[1] for p in stats.pages) / n_pages) if n_pages else 0,
+            "requests": round(sum(p[2] for p in stats.pages) / n_pages, 1) if n_pages else 0,
+            "load": _summary([p[0] for p in stats.pages]),
+        },
+        "latency": {"all": _summary(all_latencies), **{k: _summary(v) for k, v in sorted(stats.requests.items())}},
+    }
+
+
+def print_text(report: dict) -> None:
+    t = report["throughput"]
+    pp = report["perPageView"]
+    print(f"{report['pageViews']} page views, {report['requests']} requests in {report['elapsedSeconds']}s "
+          f"({report['errors']} errors, {report['cacheHits']} served from browser cache)")
+    print(f"throughput: {t['pageViewsPerSecond']} pages/s, {t['requestsPerSecond']} req/s, {t['megabytesPerSecond']} MB/s")
+    print(f"per page view: {pp['bytes'] / 1024:.1f} KB in {pp['requests']} requests, "
+          f"load p50 {pp['load']['p50_ms']}ms p95 {pp['load']['p95_ms']}ms p99 {pp['load']['p99_ms']}ms")
+    print("statuses: " + ", ".join(f"{k}: {v}" for k, v in report["statuses"].items()))
+    print(f"{'latency':<12} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for kind, s in report["latency"].items():
+        print(f"{kind:<12} {s['count']:>7} {s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9}")
+
+
+# ---- stand-in server -----------------------------------------------------------------
+
+HASHED_ASSET = re.compile(r"_cover\.[0-9a-f]{8}\.(webp|png|jpg)$")
+
+
+def _cache_control(path: str) -> str:
+    # Same rules as UseStaticFiles.OnPrepareResponse in Program.cs
+    if path.lower().endswith("/db.json"):
+        return "max-age=3600, must-revalidate"
+    if HASHED_ASSET.search(path):
+        return "public, max-age=31536000, immutable"
+    return "max-age=86400"
+
+
+class StandInServer:
+    """Minimal asyncio HTTP/1.1 static server with Program.cs routing and caching headers."""
+
+    def __init__(self, root: Path = WEB_ROOT):
+        self.root = root.resolve()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        server = await asyncio.start_server(self._handle, host, port)
+        return server, server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                await self._respond(writer, method, urllib.parse.unquote(target.split("?", 1)[0]), headers)
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except (ConnectionError, ValueError):
+            return
+        finally:
+            writer.close()
+
+    def _resolve(self, path: str) -> tuple[Optional[Path], str]:
+        trimmed = path.rstrip("/")
+        if trimmed in ("", "/index", "/index.html"):
+            return None, "/cn/"
+        if trimmed in ("/cn", "/en"):
+            return self.root / trimmed[1:] / "index.html", ""
+        candidate = (self.root / path.lstrip("/")).resolve()
+        if self.root not in candidate.parents or not candidate.is_file():
+            return None, ""
+        return candidate, ""
+
+    async def _respond(self, writer, method: str, path: str, headers: dict) -> None:
+        file_path, redirect = self._resolve(path)
+        if redirect:
+            writer.write(f"HTTP/1.1 302 Found\r\nLocation: {redirect}\r\nContent-Length: 0\r\n\r\n".encode())
+            await writer.drain()
+            return
+        if file_path is None or method not in ("GET", "HEAD"):
+            status = "404 Not Found" if file_path is None else "405 Method Not Allowed"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n\r\n".encode())
+            await writer.drain()
+            return
+
+        st = file_path.stat()
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        is_page = file_path.name == "index.html" and path.rstrip("/") in ("/cn", "/en")
+        out = {
+            "Content-Type": "text/html; charset=utf-8" if is_page else (mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"),
+            "Cache-Control": "max-age=3600, must-revalidate" if is_page else _cache_control(path),
+            "ETag": etag,
+            "Last-Modified": last_modified,
+            "Accept-Ranges": "bytes",
+        }
+        if headers.get("if-none-match") == etag or (
+                "if-none-match" not in headers and headers.get("if-modified-since") == last_modified):
+            writer.write(self._head("304 Not Modified", out))
+            await writer.drain()
+            return
+
+        start, end, status = 0, st.st_size - 1, "200 OK"
+        byte_range = headers.get("range", "")
+        if byte_range.startswith("bytes=") and "," not in byte_range:
+            first, _, last = byte_range[6:].partition("-")
+            try:
+                if first:
+                    start, end = int(first), min(int(last) if last else st.st_size - 1, st.st_size - 1)
+                else:
+                    start = max(0, st.st_size - int(last))
+            except ValueError:
+                start = st.st_size
+            if start > end or start >= st.st_size:
+                writer.write(self._head("416 Range Not Satisfiable",
+                                        {"Content-Range": f"bytes */{st.st_size}", "Content-Length": "0"}))
+                await writer.drain()
+                return
+            status = "206 Partial Content"
+            out["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        out["Content-Length"] = str(end - start + 1)
+        writer.write(self._head(status, out))
+        if method == "GET" and end >= start:
+            with open(file_path, "rb") as f:
+                await writer.drain()
+                await asyncio.get_running_loop().sendfile(writer.transport, f, start, end - start + 1)
+        await writer.drain()
+
+    @staticmethod
+    def _head(status: str, headers: dict) -> bytes:
+        return (f"HTTP/1.1 {status}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n").encode("latin-1")
+
+
+async def _main_async(args) -> dict:
+    server = None
+    if args.serve:
+        server, port = await StandInServer().start(port=args.port)
+        host = "127.0.0.1"
+        print(f"Stand-in server on http://{host}:{port}", file=sys.stderr)
+    else:
+        parsed = urllib.parse.urlsplit(args.url)
+        host, port = parsed.hostname or "127.0.0.1", parsed.port or 80
+    try:
+        stats, elapsed = await replay(host, port, args.users, args.page_views, args.play_rate, args.returning, args.seed)
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+    return build_report(stats, elapsed)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay page-view traffic built from the db.json files.")
+    target = ap.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Base URL of a running server (http only), e.g. http://127.0.0.1:5000")
+    target.add_argument("--serve", action="store_true", help="Run against the bundled stdlib stand-in server.")
+    ap.add_argument("--port", type=int, default=0, help="Port for --serve (default: any free port).")
+    ap.add_argument("--users", type=int, default=10, help="Concurrent virtual users (default 10).")
+    ap.add_argument("--page-views", type=int, default=200, help="Total page views (default 200).")
+    ap.add_argument("--play-rate", type=float, default=0.3, help="Fraction of page views that open an item (default 0.3).")
+    ap.add_argument("--returning", type=float, default=0.0, help="Fraction of page views with a warm browser cache.")
+    ap.add_argument("--seed", type=int, default=1, help="Random seed for the request mix.")
+    ap.add_argument("--format", choices=("text", "json"), default="text")
+    args = ap.parse_args()
+
+    report = asyncio.run(_main_async(args))
+    if args.format == "json":
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_text(report)
+    sys.exit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
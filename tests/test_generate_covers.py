@@ -0,0 +1,155 @@
+"""
+Memory-bounded cover generation (wwwroot/multimedia/paintings/generate_covers.py):
+MemoryBudget scheduling, strip-wise reduce, and peak RSS on synthetic large images.
+
+Run from the repository root: python3 -m pytest tests/
+"""
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+PAINTINGS_DIR = Path(__file__).resolve().parent.parent / "wwwroot" / "multimedia" / "paintings"
+sys.path.insert(0, str(PAINTINGS_DIR))  # generate_covers.py
+
+from generate_covers import MemoryBudget, _reduce_box, generate_cover
+
+# Synthetic image size for the peak RSS checks, and the budget they must stay in
+RSS_MEGAPIXELS = 12
+RSS_BUDGET_MB = 64
+
+# Runs in a fresh interpreter, so the peak RSS belongs to one generate_cover() call
+_RSS_CHILD = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from generate_covers import MemoryBudget, generate_cover
+
+def peak_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+
+baseline = peak_rss_mb()
+ok = generate_cover(sys.argv[2], sys.argv[3], budget=MemoryBudget(float(sys.argv[4])))
+print(json.dumps({"ok": ok, "baseline": baseline, "peak": peak_rss_mb()}))
+"""
+
+
+class RecordingBudget(MemoryBudget):
+    """MemoryBudget that remembers the most ever reserved at once."""
+
+    def __init__(self, total_mb):
+        super().__init__(total_mb)
+        self.max_used_mb = 0.0
+
+    def acquire(self, mb):
+        super().acquire(mb)
+        with self._cond:
+            self.max_used_mb = max(self.max_used_mb, self._used_mb)
+
+
+class MemoryBudgetTest(unittest.TestCase):
+    def test_concurrent_reservations_stay_within_budget(self):
+        budget = RecordingBudget(10)
+
+        def job(_):
+            budget.acquire(3)
+            time.sleep(0.01)
+            budget.release(3)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(job, range(32)))
+        self.assertLessEqual(budget.max_used_mb, 10)
+        self.assertEqual(budget._used_mb, 0)
+
+    def test_oversize_reservation_runs_alone(self):
+        budget = MemoryBudget(10)
+        log, lock = [], threading.Lock()
+
+        def job(name, mb, hold):
+            budget.acquire(mb)
+            with lock:
+                log.append(("start", name, budget._used_mb))
+            time.sleep(hold)
+            with lock:
+                log.append(("end", name))
+            budget.release(mb)
+
+        threads = []
+        for name, mb, hold in (("small1", 4, 0.3), ("big", 50, 0.2), ("small2", 4, 0.1)):
+            threads.append(threading.Thread(target=job, args=(name, mb, hold)))
+            threads[-1].start()
+            time.sleep(0.05)
+        for t in threads:
+            t.join(timeout=10)
+        # big waits for small1, runs alone, and small2 (arriving while big waits) does not overtake it
+        self.assertEqual([e[1] for e in log], ["small1", "small1", "big", "big", "small2", "small2"])
+        self.assertEqual(log[2], ("start", "big", 50))
+
+
+class GenerateCoverTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_reduce_box_matches_whole_image_reduce(self):
+        img = Image.radial_gradient('L').resize((900, 700)).convert('RGBA')
+        box = (100, 0, 790, 690)   # side divisible by the factor, as _reduce_box drops a partial block
+        self.assertEqual(_reduce_box(img, 3, box).tobytes(), img.crop(box).reduce(3).tobytes())
+
+    def test_oversize_image_still_gets_cover(self):
+        src = os.path.join(self.tmp, "big.png")
+        Image.new("RGBA", (3000, 2000), (200, 10, 10, 128)).save(src)   # ~23MB decoded
+        out = os.path.join(self.tmp, "cover.png")
+        self.assertTrue(generate_cover(src, out, budget=MemoryBudget(5)))
+        with Image.open(out) as cover:
+            self.assertEqual(cover.size, (250, 250))
+
+    def test_parallel_covers_share_small_budget(self):
+        paths = []
+        for i in range(4):
+            paths.append(os.path.join(self.tmp, f"{i}.png"))
+            Image.new("RGB", (1600, 1200), (i * 60, 0, 0)).save(paths[-1])   # ~7MB decoded each
+        budget = RecordingBudget(10)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            ok = list(pool.map(lambda p: generate_cover(p, p + ".cover.png", budget=budget), paths))
+        self.assertEqual(ok, [True] * 4)
+        self.assertLessEqual(budget.max_used_mb, 10)
+
+    @unittest.skipUnless(os.path.exists("/proc/self/status"), "needs /proc for peak RSS")
+    def test_peak_rss_within_budget_on_large_images(self):
+        width = int(math.sqrt(RSS_MEGAPIXELS * 1e6 * 4 / 3))
+        height = int(width * 3 / 4)
+        gradient = Image.radial_gradient('L').resize((width, height))
+        rgb = Image.merge('RGB', (gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient))
+        rgb.save(os.path.join(self.tmp, 'large.jpg'), 'JPEG')
+        rgb.putalpha(gradient)
+        rgb.save(os.path.join(self.tmp, 'large.png'), 'PNG')
+        del gradient, rgb
+        for name in ('large.jpg', 'large.png'):
+            with self.subTest(image=name):
+                r = subprocess.run(
+                    [sys.executable, "-c", _RSS_CHILD, str(PAINTINGS_DIR), os.path.join(self.tmp, name),
+                     os.path.join(self.tmp, 'cover.png'), str(RSS_BUDGET_MB)],
+                    capture_output=True, text=True, timeout=120, check=True,
+                )
+                result = json.loads(r.stdout.strip().splitlines()[-1])
+                self.assertTrue(result["ok"])
+                self.assertLessEqual(result["peak"] - result["baseline"], RSS_BUDGET_MB)
+
+
+if __name__ == "__main__":
+    unittest.main()
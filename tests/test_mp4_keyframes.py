@@ -0,0 +1,86 @@
+"""
+Keyframe times from the MP4 index (wwwroot/multimedia/chunked_encode.py) on
+synthetic moov boxes: composition offsets (ctts) and edit lists (elst) are applied.
+
+Run from the repository root: python3 -m pytest tests/
+"""
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "wwwroot" / "multimedia"))  # chunked_encode.py
+
+from chunked_encode import mp4_keyframe_times
+
+
+def box(box_type: bytes, *payload: bytes) -> bytes:
+    data = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(data), box_type) + data
+
+
+def full_box(box_type: bytes, *payload: bytes, version: int = 0) -> bytes:
+    return box(box_type, bytes([version, 0, 0, 0]), *payload)
+
+
+def table(box_type: bytes, fmt: str, entries: list, version: int = 0) -> bytes:
+    return full_box(box_type, struct.pack(">I", len(entries)),
+                    *(struct.pack(fmt, *e) for e in entries), version=version)
+
+
+def mp4(samples: int, delta: int, sync: list, ctts=None, edits=None, timescale=1000, movie_timescale=1000) -> bytes:
+    """ftyp + moov with one video track of `samples` samples `delta` apart, + empty mdat."""
+    stbl = [table(b"stts", ">II", [(samples, delta)]), table(b"stss", ">I", [(n,) for n in sync])]
+    if ctts is not None:
+        stbl.append(table(b"ctts", ">Ii", ctts))
+    mdia = box(b"mdia",
+               full_box(b"mdhd", struct.pack(">IIII4x", 0, 0, timescale, samples * delta)),
+               full_box(b"hdlr", b"\0" * 4, b"vide", b"\0" * 13),
+               box(b"minf", box(b"stbl", *stbl)))
+    trak = [mdia]
+    if edits is not None:
+        trak.insert(0, box(b"edts", table(b"elst", ">Ii4x", edits)))
+    moov = box(b"moov", full_box(b"mvhd", struct.pack(">IIII", 0, 0, movie_timescale, 0), b"\0" * 80),
+               box(b"trak", *trak))
+    return box(b"ftyp", b"isom", b"\0\0\0\0") + moov + box(b"mdat")
+
+
+class Mp4KeyframeTimesTest(unittest.TestCase):
+    def times(self, data: bytes):
+        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as f:
+            f.write(data)
+        try:
+            return mp4_keyframe_times(f.name)
+        finally:
+            os.unlink(f.name)
+
+    def assertTimes(self, actual, expected):
+        self.assertIsNotNone(actual)
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            self.assertAlmostEqual(a, e, places=6)
+
+    def test_decode_times_without_ctts_or_edit_list(self):
+        self.assertTimes(self.times(mp4(30, 100, [1, 11, 21])), [0.0, 1.0, 2.0])
+
+    def test_b_frame_offsets_cancelled_by_edit_list(self):
+        # IPB stream: every sample delayed by 2 frames in composition, edit list starts the track there
+        data = mp4(30, 100, [1, 11, 21], ctts=[(30, 200)], edits=[(3000, 200)])
+        self.assertTimes(self.times(data), [0.0, 1.0, 2.0])
+
+    def test_ctts_applied_per_keyframe(self):
+        ctts = [(1, 200), (9, 100), (1, 300), (19, 100)]   # samples 1 and 11 have different offsets
+        self.assertTimes(self.times(mp4(30, 100, [1, 11, 21], ctts=ctts)), [0.2, 1.3, 2.1])
+
+    def test_leading_empty_edit_delays_track(self):
+        data = mp4(30, 100, [1, 11, 21], edits=[(300, -1), (3000, 0)], movie_timescale=600)
+        self.assertTimes(self.times(data), [0.5, 1.5, 2.5])
+
+    def test_multi_segment_edit_list_left_to_ffprobe(self):
+        self.assertIsNone(self.times(mp4(30, 100, [1, 11, 21], edits=[(1000, 0), (1000, 2000)])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Watch the media folders and process new/changed files incrementally, so new
+uploads go live in seconds without running update_db.py / extract_covers.py /
+generate_covers.py by hand.
+
+Watched folders (under wwwroot/multimedia):
+- lsLearns/cn/videos, lsLearns/en/videos  -> duration, first-frame cover, db.json entry
+- music/videos                            -> duration, cropped cover (coverOffet), db.json entry
+- paintings/images                        -> square cover, db.json entry
+
+Uses Linux inotify (via ctypes, no extra packages); falls back to polling
+directory snapshots where inotify is unavailable (macOS, some containers).
+
+Partial uploads are debounced: a file is processed only once no events arrived
+for --debounce seconds and its size/mtime are unchanged. Temp/hidden names
+(.part, .tmp, dotfiles) are ignored. Settled files are processed as one batch
+in a bounded worker pool; each affected db.json is rewritten once per batch and
+the local /api/manager/reload-cache endpoint is called once per batch.
+
+With --hashed-names (or once a db.json records "cover"), each cover is also
+published as xxx_cover.<hash8>.webp and recorded in the entry (see
+wwwroot/multimedia/cover_names.py); superseded versions are deleted after the
+grace period when the db.json is next rewritten.
+
+Usage:
+  python3 watch_media.py [--workers 2] [--debounce 3] [--poll] [--no-reload]
+"""
+import argparse
+import base64
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import importlib.util
+import json
+import os
+import select
+import struct
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_BASE = "wwwroot/multimedia"
+DEFAULT_RELOAD_URL = "http://127.0.0.1:8080/api/manager/reload-cache"
+
+# (section folder with db.json, watched folder, kind) relative to the multimedia folder
+WATCHES = [
+    ("lsLearns/cn", "lsLearns/cn/videos", "lesson"),
+    ("lsLearns/en", "lsLearns/en/videos", "lesson"),
+    ("music", "music/videos", "music"),
+    ("paintings", "paintings/images", "painting"),
+]
+
+# Sections whose page plays a video missing from their own folder from another
+# one (en/index.html falls back to lsLearns/cn/videos with the same file name)
+FALLBACKS = {
+    "lsLearns/en": "lsLearns/cn/videos",
+}
+
+VIDEO_EXTENSIONS = {".mp4", ".m4v"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".heic"}
+TEMP_SUFFIXES = {".part", ".tmp", ".partial", ".crdownload", ".download", ".filepart"}
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Marker for files whose processing raised; their db.json entry is left untouched
+FAILED = object()
+
+
+def log(msg: str) -> None:
+    print(f"[{datetime.now():%H:%M:%S}] {msg}", flush=True)
+
+
+def is_candidate(path: Path) -> bool:
+    """True for media files worth processing (not hidden, not an in-progress temp file)."""
+    name = path.name
+    if name.startswith(".") or name.startswith("~"):
+        return False
+    suffixes = {s.lower() for s in path.suffixes}
+    if suffixes & TEMP_SUFFIXES:
+        return False
+    return path.suffix.lower() in VIDEO_EXTENSIONS | IMAGE_EXTENSIONS
+
+
+class InotifySource:
+    """Minimal inotify reader over ctypes. Raises OSError if inotify is unavailable."""
+
+    def __init__(self, dirs: list[Path]):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify not available")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wd_to_dir = {}
+        for d in dirs:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(d)), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {d}")
+            self._wd_to_dir[wd] = d
+        self.overflowed = False
+
+    def poll(self, timeout: float) -> list[Path]:
+        """Return paths with events (deduplicated), waiting up to timeout seconds."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        paths = {}
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + name_len].rstrip(b"\0")
+                offset += name_len
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+                if mask & IN_ISDIR or not name or wd not in self._wd_to_dir:
+                    continue
+                p = self._wd_to_dir[wd] / os.fsdecode(name)
+                paths[p] = None
+        return list(paths)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingSource:
+    """Fallback: compare (size, mtime) snapshots of the watched folders."""
+
+    def __init__(self, dirs: list[Path], interval: float):
+        self._dirs = dirs
+        self._interval = interval
+        self._snapshot = self._scan()
+        self.overflowed = False
+
+    def _scan(self) -> dict:
+        snap = {}
+        for d in self._dirs:
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.is_file():
+                            st = e.stat()
+                            snap[Path(e.path)] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+        return snap
+
+    def poll(self, timeout: float) -> list[Path]:
+        time.sleep(min(timeout, self._interval))
+        new = self._scan()
+        changed = [p for p, sig in new.items() if self._snapshot.get(p) != sig]
+        changed += [p for p in self._snapshot if p not in new]
+        self._snapshot = new
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+_modules = {}
+_modules_lock = threading.Lock()
+
+
+def load_script(base_dir: Path, relpath: str):
+    """Import one of the per-folder scripts (e.g. music/extract_covers.py) by path, once."""
+    with _modules_lock:
+        if relpath not in _modules:
+            path = base_dir / relpath
+            spec = importlib.util.spec_from_file_location(relpath.replace("/", "_")[:-3], path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _modules[relpath] = module
+        return _modules[relpath]
+
+
+def read_db(db_path: Path) -> dict:
+    if db_path.exists():
+        with open(db_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"list": []}
+
+
+def write_db(db_path: Path, db: dict) -> None:
+    """Write db.json atomically so the web app never reads a half-written file."""
+    fd, tmp = tempfile.mkstemp(prefix=".db.", suffix=".json", dir=db_path.parent)
+    try:
+        os.chmod(tmp, db_path.stat().st_mode & 0o777 if db_path.exists() else 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(db, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, db_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class MediaProcessor:
+    """Per-file work (probe, cover) and per-batch db.json updates."""
+
+    def __init__(self, base_dir: Path, hashed_names: bool = False):
+        self.base_dir = base_dir
+        self.hashed_names = hashed_names
+
+    def _publish(self, section: str, cover_path: Path, fields: dict) -> None:
+        """Add the content-hashed cover name to fields when the section uses them."""
+        names = load_script(self.base_dir, "cover_names.py")
+        if names.hashed_names_enabled(self.base_dir / section / "db.json", self.hashed_names):
+            name = names.publish(cover_path)
+            if name:
+                fields["cover"] = name
+
+    def process(self, section: str, kind: str, path: Path) -> Optional[dict]:
+        """
+        Probe and generate the cover for one file. Runs in a worker thread.
+        Returns the db.json fields for the entry, or None if the file is gone.
+        A deleted file the page still serves from its fallback folder keeps its
+        entry, with the duration and cover taken from the fallback copy.
+        """
+        if not path.is_file():
+            fallback = FALLBACKS.get(section)
+            path = self.base_dir / fallback / path.name if fallback else path
+            if not path.is_file():
+                return None
+            log(f"  {section}/{path.name}: deleted, served from {fallback}")
+        cover_dir = self.base_dir / section / "covers_generated"
+        cover_dir.mkdir(exist_ok=True)
+        cover_path = cover_dir / (path.stem + "_cover.png")
+        fields = {"filename": path.name}
+        if kind == "painting":
+            covers = load_script(self.base_dir, "paintings/generate_covers.py")
+            if path.suffix.lower() == ".heic":
+                try:
+                    from pillow_heif import register_heif_opener
+                    register_heif_opener()
+                except ImportError:
+                    log(f"  {path.name}: HEIC support requires pillow-heif, no cover generated")
+                    return fields
+            if not covers.generate_cover(str(path), str(cover_path)):
+                log(f"  {path.name}: cover FAILED")
+            else:
+                self._publish(section, cover_path, fields)
+            return fields
+
+        probe = load_script(self.base_dir, "lsLearns/update_db.py")
+        duration = probe.get_duration_seconds(path)
+        if duration is not None:
+            fields["durationInSeconds"] = str(int(round(duration)))
+        if kind == "music":
+            covers = load_script(self.base_dir, "music/extract_covers.py")
+            offset = covers.load_cover_offsets().get(path.name, 0)
+            ok = covers.extract_cover(str(path), str(cover_path), covers.COVER_WIDTH, covers.COVER_HEIGHT, offset)
+        else:
+            covers = load_script(self.base_dir, "lsLearns/extract_covers.py")
+            ok = covers.extract_cover(str(path), str(cover_path))
+        if not ok:
+            log(f"  {path.name}: cover FAILED")
+        else:
+            self._publish(section, cover_path, fields)
+        return fields
+
+    def safe_process(self, section: str, kind: str, path: Path):
+        """process() that logs errors and returns FAILED instead of raising."""
+        try:
+            return self.process(section, kind, path)
+        except Exception as e:
+            log(f"  {section}/{path.name}: error {e}")
+            return FAILED
+
+    def apply(self, section: str, changes: dict) -> int:
+        """
+        Merge {filename: fields or None} into section/db.json in one write.
+        New files are appended, existing entries keep their hand-edited fields,
+        deleted files are removed along with their covers (the plain one and the
+        hashed one the entry records). Returns entries changed.
+        """
+        db_path = self.base_dir / section / "db.json"
+        db = read_db(db_path)
+        items = db.setdefault("list", [])
+        index = {item.get("filename"): item for item in items}
+        changed = 0
+        for filename, fields in changes.items():
+            if fields is None:
+                cover_dir = self.base_dir / section / "covers_generated"
+                covers = [cover_dir / (Path(filename).stem + "_cover.png")]
+                if filename in index:
+                    entry = index.pop(filename)
+                    items.remove(entry)
+                    changed += 1
+                    if entry.get("cover"):
+                        covers.append(cover_dir / Path(entry["cover"]).name)
+                for cover in covers:
+                    if cover.exists():
+                        cover.unlink()
+                continue
+            if filename in index:
+                index[filename].update(fields)
+            else:
+                items.append(dict(fields))
+                index[filename] = items[-1]
+            changed += 1
+        if changed:
+            write_db(db_path, db)
+            names = load_script(self.base_dir, "cover_names.py")
+            if names.hashed_names_enabled(db_path, self.hashed_names):
+                names.collect_garbage(self.base_dir / section / "covers_generated", db_path)
+        return changed
+
+
+def manager_token() -> str:
+    """Same daily token as Program.cs: base64(sha256("ls:yyyyMMdd")) in UTC."""
+    day = datetime.now(timezone.utc).strftime("%Y%m%d")
+    return base64.b64encode(hashlib.sha256(f"ls:{day}".encode("utf-8")).digest()).decode("ascii")
+
+
+def reload_cache(url: str) -> None:
+    req = urllib.request.Request(url, data=b"", method="POST",
+                                 headers={"Authorization": f"Bearer {manager_token()}"})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            body = json.loads(resp.read().decode("utf-8") or "{}")
+            log(f"reload-cache: {body.get('message') or body}")
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        log(f"reload-cache failed: {e}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Watch media folders and process uploads incrementally.")
+    ap.add_argument("--base", default=DEFAULT_BASE, help=f"multimedia folder, relative to this script (default {DEFAULT_BASE})")
+    ap.add_argument("--workers", type=int, default=2, help="Files processed in parallel (default 2).")
+    ap.add_argument("--debounce", type=float, default=3.0, help="Seconds a file must be quiet before processing (default 3).")
+    ap.add_argument("--poll", action="store_true", help="Use directory polling instead of inotify.")
+    ap.add_argument("--poll-interval", type=float, default=2.0)
+    ap.add_argument("--reload-url", default=DEFAULT_RELOAD_URL)
+    ap.add_argument("--no-reload", action="store_true", help="Do not call the reload-cache endpoint.")
+    ap.add_argument("--hashed-names", action="store_true",
+                    help="Also publish content-hashed covers and record them in db.json (stays on once recorded).")
+    args = ap.parse_args()
+
+    base_dir = (SCRIPT_DIR / args.base).resolve()
+    watches = [(section, base_dir / folder, kind) for section, folder, kind in WATCHES if (base_dir / folder).is_dir()]
+    if not watches:
+        print(f"No media folders found under {base_dir}")
+        sys.exit(1)
+    dir_info = {d: (section, kind) for section, d, kind in watches}
+
+    source = None
+    if not args.poll:
+        try:
+            source = InotifySource(list(dir_info))
+            log("Using inotify")
+        except OSError as e:
+            log(f"inotify unavailable ({e}), falling back to polling")
+    if source is None:
+        source = PollingSource(list(dir_info), args.poll_interval)
+        log(f"Polling every {args.poll_interval}s")
+    for section, d, _ in watches:
+        log(f"Watching {d.relative_to(base_dir)} -> {section}/db.json")
+
+    processor = MediaProcessor(base_dir, args.hashed_names)
+    pending = {}  # path -> (last event time, (size, mtime) or None)
+
+    def signature(p: Path):
+        try:
+            st = p.stat()
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        try:
+            while True:
+                now = time.monotonic()
+                for p in source.poll(timeout=0.5):
+                    if p.parent in dir_info and is_candidate(p):
+                        pending[p] = (now, signature(p))
+                if source.overflowed:
+                    log("inotify queue overflowed; some events may be lost (restart to rescan)")
+                    source.overflowed = False
+
+                now = time.monotonic()
+                batch = []
+                for p, (t, sig) in list(pending.items()):
+                    if now - t < args.debounce:
+                        continue
+                    current = signature(p)
+                    if current != sig:
+                        pending[p] = (now, current)  # still being written
+                        continue
+                    batch.append(p)
+                    del pending[p]
+                if not batch:
+                    continue
+
+                started = time.monotonic()
+                log(f"Processing {len(batch)} file(s)")
+                jobs = [(p, *dir_info[p.parent]) for p in sorted(batch)]
+                results = pool.map(lambda job: processor.safe_process(job[1], job[2], job[0]), jobs)
+                changes = {}
+                for (p, section, _), fields in zip(jobs, results):
+                    if fields is FAILED:
+                        continue
+                    changes.setdefault(section, {})[p.name] = fields
+                    log(f"  {section}/{p.name}: {'removed' if fields is None else 'updated'}")
+                total = sum(processor.apply(section, c) for section, c in changes.items())
+                log(f"Batch done: {total} db.json entries changed in {time.monotonic() - started:.1f}s")
+                if total and not args.no_reload:
+                    reload_cache(args.reload_url)
+        except KeyboardInterrupt:
+            log("Stopping")
+        finally:
+            source.close()
+
+
+if __name__ == "__main__":
+    main()
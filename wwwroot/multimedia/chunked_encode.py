@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Keyframe-split parallel encoding for long videos.
+
+libx264 scales poorly beyond a handful of threads, so one long lesson keeps the
+box mostly idle. Here the source is split at its keyframes into chunks that are
+encoded concurrently by separate ffmpeg processes with identical settings, then
+concatenated losslessly (stream copy) into one faststart MP4. Audio is encoded
+once, in parallel with the video chunks, over the whole range.
+
+Keyframes come from the MP4 box index (moov/trak/stbl: stss + stts + mdhd),
+read with a few seeks (../mp4_boxes.py). They are presentation times, as
+ffmpeg's -ss sees them: ctts composition offsets (B-frames) and the elst edit
+list are applied. ffprobe is the fallback for other containers and for edit
+lists with more than one media segment.
+
+Used by music/compress_video.py (--chunked) and
+lsLearns/trim_title_screens.py (--chunked).
+
+Usage (encodes both ways and reports speedup and size overhead):
+  python3 chunked_encode.py <video> [--workers N] [--crf 23]
+"""
+import argparse
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # shared mp4_boxes.py
+from mp4_boxes import find_box, find_path, iter_boxes
+
+MIN_CHUNK_SECONDS = 20.0   # shorter chunks cost more in rate-control restarts than they gain
+SPLIT_EPSILON = 0.001      # split just before the keyframe so it starts the next chunk
+
+
+def _timescale(f, box) -> int:
+    """Timescale of an mvhd/mdhd box (same layout up to it)."""
+    f.seek(box[0])
+    version = f.read(1)[0]
+    f.seek(box[0] + (20 if version == 1 else 12))
+    return struct.unpack(">I", f.read(4))[0]
+
+
+def _table(f, box, fmt: str) -> list:
+    """Entries of a full box that holds entry_count and then fixed-size entries (stts, stss, ctts)."""
+    f.seek(box[0] + 4)
+    (n,) = struct.unpack(">I", f.read(4))
+    return list(struct.iter_unpack(fmt, f.read(n * struct.calcsize(fmt))))
+
+
+def _at_samples(runs: list, samples: list, cumulative: bool) -> list:
+    """
+    Values of a run-length sample table [(count, value)] for sorted 1-based
+    sample numbers: the sum of all earlier values (stts -> decode time) or the
+    run's own value (ctts -> composition offset).
+    """
+    out = []
+    first, total, i = 1, 0, 0
+    for count, value in runs:
+        while i < len(samples) and samples[i] < first + count:
+            out.append(total + (samples[i] - first) * value if cumulative else value)
+            i += 1
+        first += count
+        total += count * value
+    return out
+
+
+def _edit_shift(f, trak: tuple, movie_timescale: int, timescale: int) -> Optional[float]:
+    """
+    Seconds to add to media times for the track's edit list: leading empty
+    edits delay the track, the media segment's media_time cuts its start.
+    0.0 without an edit list; None for lists with more than one media segment.
+    """
+    elst = find_path(f, *trak, b"edts", b"elst")
+    if elst is None:
+        return 0.0
+    f.seek(elst[0])
+    version = f.read(1)[0]
+    edits = _table(f, elst, ">Qq4x" if version == 1 else ">Ii4x")
+    empty = 0
+    while edits and edits[0][1] == -1:
+        empty += edits.pop(0)[0]
+    if len(edits) > 1:
+        return None
+    media_time = edits[0][1] if edits else 0
+    return (empty / movie_timescale if movie_timescale else 0.0) - media_time / timescale
+
+
+def mp4_keyframe_times(path: str) -> Optional[list[float]]:
+    """Keyframe presentation times (seconds) of the first video track from the MP4 index, or None."""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            moov = find_box(f, 0, size, b"moov")
+            mvhd = moov and find_box(f, *moov, b"mvhd")
+            if not mvhd:
+                return None
+            movie_timescale = _timescale(f, mvhd)
+            for t, payload, box_end in iter_boxes(f, *moov):
+                if t != b"trak":
+                    continue
+                mdia = find_path(f, payload, box_end, b"mdia")
+                hdlr = mdia and find_box(f, *mdia, b"hdlr")
+                if not hdlr:
+                    continue
+                f.seek(hdlr[0] + 8)
+                if f.read(4) != b"vide":
+                    continue
+                timescale = _timescale(f, find_box(f, *mdia, b"mdhd"))
+                stbl = find_path(f, *mdia, b"minf", b"stbl")
+                stts = stbl and find_box(f, *stbl, b"stts")
+                if not stts or not timescale:
+                    return None
+                shift = _edit_shift(f, (payload, box_end), movie_timescale, timescale)
+                if shift is None:
+                    return None   # multi-segment edit list: let ffprobe resolve it
+                runs = _table(f, stts, ">II")
+                stss = find_box(f, *stbl, b"stss")
+                if stss is None:
+                    # No sync sample table: every sample is a keyframe; use 1s spacing
+                    total = sum(count * delta for count, delta in runs) / timescale
+                    return [float(s) for s in range(int(total) + 1)]
+                sync = sorted(n for (n,) in _table(f, stss, ">I"))
+                dts = _at_samples(runs, sync, cumulative=True)
+                ctts = find_box(f, *stbl, b"ctts")
+                # Offsets are signed in version 1 and, in practice, also in version 0
+                cts = _at_samples(_table(f, ctts, ">Ii"), sync, cumulative=False) if ctts else [0] * len(sync)
+                if len(dts) != len(sync) or len(cts) != len(sync):
+                    return None   # tables shorter than the sync list: malformed index
+                return sorted((d + c) / timescale + shift for d, c in zip(dts, cts))
+    except (OSError, ValueError, struct.error, IndexError, TypeError):
+        return None
+    return None
+
+
+def ffprobe_keyframe_times(path: str) -> Optional[list[float]]:
+    """Keyframe times via ffprobe packet flags (no decoding), or None."""
+    try:
+        r = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path],
+            capture_output=True, text=True, timeout=300,
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return None
+    if r.returncode != 0:
+        return None
+    times = []
+    for line in r.stdout.splitlines():
+        parts = line.split(",")
+        if len(parts) >= 2 and "K" in parts[1] and parts[0] not in ("", "N/A"):
+            times.append(float(parts[0]))
+    return sorted(times) or None
+
+
+def keyframe_times(path: str) -> Optional[list[float]]:
+    return mp4_keyframe_times(path) or ffprobe_keyframe_times(path)
+
+
+def plan_chunks(keyframes: list[float], start: float, end: float, chunks: int) -> list[tuple[float, Optional[float]]]:
+    """
+    Split [start, end) into up to `chunks` pieces at keyframes, each at least
+    MIN_CHUNK_SECONDS long. Returns [(chunk_start, chunk_seconds or None for the last)].
+    """
+    length = end - start
+    chunks = max(1, min(chunks, int(length // MIN_CHUNK_SECONDS)))
+    inner = [k for k in keyframes if start + MIN_CHUNK_SECONDS <= k <= end - MIN_CHUNK_SECONDS]
+    cuts = []
+    for i in range(1, chunks):
+        if not inner:
+            break
+        ideal = start + length * i / chunks
+        k = min(inner, key=lambda x: abs(x - ideal))
+        split = k - SPLIT_EPSILON
+        if split - (cuts[-1] if cuts else start) >= MIN_CHUNK_SECONDS:
+            cuts.append(split)
+    bounds = [start] + cuts
+    return [(a, (bounds[n + 1] - a) if n + 1 < len(bounds) else None) for n, a in enumerate(bounds)]
+
+
+def _run(cmd: list) -> bool:
+    r = subprocess.run(cmd, capture_output=True, text=True)
+    if r.returncode != 0:
+        print(f"    ffmpeg failed: {r.stderr.strip()[-500:]}")
+    return r.returncode == 0
+
+
+def encode_chunked(input_file: str, output_file: str, video_args: list, audio_args: list,
+                   start: float = 0.0, end: Optional[float] = None, duration: Optional[float] = None,
+                   workers: Optional[int] = None) -> Optional[dict]:
+    """
+    Encode input_file[start:end] to output_file with video_args (e.g. ["-c:v", "libx264", "-crf", "23"])
+    in parallel keyframe-split chunks, and audio_args (e.g. ["-c:a", "aac", "-b:a", "128k"]) in one pass.
+    `duration` is the source duration (needed when end is None).
+    Returns {"chunks", "seconds", "size"} or None on failure.
+    """
+    cpus = os.cpu_count() or 2
+    workers = workers or max(1, cpus // 2)
+    end = end if end is not None else duration
+    if end is None:
+        print("    chunked encode needs the source duration")
+        return None
+    keyframes = keyframe_times(input_file) or []
+    plan = plan_chunks(keyframes, start, end, workers)
+    threads = max(1, cpus // len(plan))
+    started = time.monotonic()
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file))) as tmp:
+        chunk_files = [os.path.join(tmp, f"chunk{n:04d}.mp4") for n in range(len(plan))]
+        audio_file = os.path.join(tmp, "audio.m4a")
+        jobs = []
+        for (a, seconds), out in zip(plan, chunk_files):
+            cmd = ["ffmpeg", "-v", "error", "-ss", f"{a:.3f}", "-i", input_file]
+            if seconds is not None:
+                cmd += ["-t", f"{seconds:.3f}"]
+            elif end < (duration or end + 1):
+                cmd += ["-t", f"{end - a:.3f}"]
+            jobs.append(cmd + ["-an", "-sn"] + video_args + ["-threads", str(threads), "-y", out])
+        audio_cmd = ["ffmpeg", "-v", "error", "-ss", f"{start:.3f}", "-i", input_file, "-t", f"{end - start:.3f}",
+                     "-vn", "-sn"] + audio_args + ["-y", audio_file]
+
+        with ThreadPoolExecutor(max_workers=len(jobs) + 1) as pool:
+            audio_future = pool.submit(subprocess.run, audio_cmd, capture_output=True)
+            if not all(pool.map(_run, jobs)):
+                return None
+            has_audio = audio_future.result().returncode == 0 and os.path.exists(audio_file)
+
+        list_file = os.path.join(tmp, "chunks.txt")
+        with open(list_file, "w", encoding="utf-8") as f:
+            for c in chunk_files:
+                f.write("file '" + c.replace("'", "'\\''") + "'\n")
+        cmd = ["ffmpeg", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_file]
+        if has_audio:
+            cmd += ["-i", audio_file, "-map", "0:v", "-map", "1:a"]
+        cmd += ["-c", "copy", "-movflags", "+faststart", "-y", output_file]
+        if not _run(cmd):
+            return None
+
+    return {"chunks": len(plan), "seconds": time.monotonic() - started, "size": os.path.getsize(output_file)}
+
+
+def probe_duration(path: str) -> Optional[float]:
+    try:
+        r = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration",
+                            "-of", "default=noprint_wrappers=1:nokey=1", path],
+                           capture_output=True, text=True, timeout=30)
+        return float(r.stdout.strip()) if r.returncode == 0 and r.stdout.strip() else None
+    except (FileNotFoundError, subprocess.TimeoutExpired, ValueError):
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare chunked parallel encoding with a single ffmpeg process.")
+    ap.add_argument("video")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--crf", type=float, default=23.0)
+    args = ap.parse_args()
+
+    duration = probe_duration(args.video)
+    if duration is None:
+        print("Could not get video duration (need ffprobe)")
+        raise SystemExit(1)
+    video_args = ["-c:v", "libx264", "-crf", f"{args.crf:g}"]
+    audio_args = ["-c:a", "aac", "-b:a", "128k"]
+    with tempfile.TemporaryDirectory() as tmp:
+        single_out = os.path.join(tmp, "single.mp4")
+        t0 = time.monotonic()
+        if not _run(["ffmpeg", "-v", "error", "-i", args.video] + video_args + audio_args
+                    + ["-movflags", "+faststart", "-y", single_out]):
+            raise SystemExit(1)
+        single_seconds = time.monotonic() - t0
+        single_size = os.path.getsize(single_out)
+        result = encode_chunked(args.video, os.path.join(tmp, "chunked.mp4"), video_args, audio_args,
+                                duration=duration, workers=args.workers)
+        if result is None:
+            raise SystemExit(1)
+    print(f"single process: {single_seconds:.1f}s, {single_size / 1048576:.2f}MB")
+    print(f"chunked ({result['chunks']} chunks): {result['seconds']:.1f}s, {result['size'] / 1048576:.2f}MB")
+    print(f"speedup {single_seconds / result['seconds']:.2f}x, size overhead {(result['size'] / single_size - 1) * 100:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
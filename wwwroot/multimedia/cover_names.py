@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Content-hashed cover names for the cover scripts (paintings/generate_covers.py,
+lsLearns/extract_covers.py, music/extract_covers.py) and watch_media.py.
+
+With --hashed-names, each generated covers_generated/xxx_cover.png is also
+published as xxx_cover.<hash8>.webp, where hash8 is the start of the SHA-256 of
+the published bytes, and the name is recorded in the db.json entry as "cover".
+The front end loads item.cover when present, and Program.cs serves these names
+as immutable with year-long caching: a changed cover gets a new name, so
+browsers never revalidate or keep a stale one. The plain _cover.png is kept as
+the working copy and for entries without "cover".
+
+Versions no longer referenced by db.json are deleted GC_GRACE_DAYS after they
+were first seen unreferenced (pages and db.json cached before the change may
+still point at them); the times are kept in .cache/superseded_covers.json.
+Once a db.json records covers, the scripts keep publishing them without the flag.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+HASH_LENGTH = 8
+HASHED_FORMAT = ".webp"
+WEBP_QUALITY = 85
+GC_GRACE_DAYS = 7
+HASHED_COVER = re.compile(r"_cover\.[0-9a-f]{8}\.(webp|png|jpg)$")
+SUPERSEDED_PATH = Path(__file__).resolve().parents[2] / ".cache" / "superseded_covers.json"
+
+
+def hashed_names_enabled(db_path, requested: bool = False) -> bool:
+    """True if asked for, or if db.json already records hashed covers (the mode is sticky)."""
+    if requested:
+        return True
+    try:
+        with open(db_path, "r", encoding="utf-8") as f:
+            return any(isinstance(e, dict) and e.get("cover") for e in json.load(f).get("list", []))
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def _encode(plain_path: str, ext: str) -> Optional[bytes]:
+    """Bytes of the cover in format ext (PIL, then OpenCV); the plain file as is for its own format."""
+    if ext == os.path.splitext(plain_path)[1].lower():
+        with open(plain_path, "rb") as f:
+            return f.read()
+    try:
+        from PIL import Image
+        with Image.open(plain_path) as im:
+            buf = io.BytesIO()
+            if ext == ".webp":
+                im.save(buf, "WEBP", quality=WEBP_QUALITY, method=6)
+            else:
+                im.convert("RGB").save(buf, "JPEG", quality=WEBP_QUALITY)
+            return buf.getvalue()
+    except ImportError:
+        pass
+    except (OSError, KeyError, ValueError):
+        return None
+    try:
+        import cv2
+        img = cv2.imread(plain_path, cv2.IMREAD_UNCHANGED)
+        params = [cv2.IMWRITE_WEBP_QUALITY, WEBP_QUALITY] if ext == ".webp" else [cv2.IMWRITE_JPEG_QUALITY, WEBP_QUALITY]
+        ok, data = cv2.imencode(ext, img, params) if img is not None else (False, None)
+        return data.tobytes() if ok else None
+    except ImportError:
+        return None
+
+
+def publish(plain_path, ext: str = HASHED_FORMAT) -> Optional[str]:
+    """
+    Write <stem>.<hash8><ext> next to plain_path (e.g. xxx_cover.1a2b3c4d.webp)
+    unless it exists, and return its file name; None if the cover cannot be read.
+    """
+    plain_path = str(plain_path)
+    if not os.path.isfile(plain_path):
+        return None
+    data = _encode(plain_path, ext)
+    if data is None and ext != ".png":
+        ext = os.path.splitext(plain_path)[1].lower()   # no encoder: publish the file itself
+        data = _encode(plain_path, ext)
+    if not data:
+        return None
+    stem = os.path.splitext(os.path.basename(plain_path))[0]
+    name = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+    out_path = os.path.join(os.path.dirname(plain_path), name)
+    if not os.path.exists(out_path):
+        fd, tmp = tempfile.mkstemp(prefix=".cover.", suffix=ext, dir=os.path.dirname(plain_path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, out_path)
+    return name
+
+
+def _write_json(path, data) -> None:
+    """Atomic write, so the web app never reads a half-written file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.stem}.", suffix=".json", dir=path.parent)
+    try:
+        os.chmod(tmp, path.stat().st_mode & 0o777 if path.exists() else 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def record_covers(db_path, covers: dict) -> int:
+    """Set "cover" on the db.json entries named in {filename: cover name}; returns entries changed."""
+    with open(db_path, "r", encoding="utf-8") as f:
+        db = json.load(f)
+    changed = 0
+    for item in db.get("list", []):
+        name = covers.get(item.get("filename"))
+        if name and item.get("cover") != name:
+            item["cover"] = name
+            changed += 1
+    if changed:
+        _write_json(db_path, db)
+    return changed
+
+
+def collect_garbage(cover_dir, db_path, grace_days: float = GC_GRACE_DAYS, now: Optional[float] = None) -> list:
+    """
+    Delete hashed covers in cover_dir that db_path does not reference and that
+    have been unreferenced for grace_days; returns the names deleted.
+    """
+    now = time.time() if now is None else now
+    try:
+        with open(db_path, "r", encoding="utf-8") as f:
+            referenced = {e.get("cover") for e in json.load(f).get("list", []) if isinstance(e, dict)}
+    except (OSError, ValueError):
+        return []   # never delete on a db.json we cannot read
+    try:
+        with open(SUPERSEDED_PATH, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    cover_dir = os.path.abspath(cover_dir)
+    seen = state.get(cover_dir, {})
+    current, deleted = {}, []
+    for name in sorted(os.listdir(cover_dir)) if os.path.isdir(cover_dir) else []:
+        if not HASHED_COVER.search(name) or name in referenced:
+            continue
+        since = seen.get(name, now)
+        if now - since >= grace_days * 86400:
+            os.remove(os.path.join(cover_dir, name))
+            deleted.append(name)
+        else:
+            current[name] = since
+    if current:
+        state[cover_dir] = current
+    else:
+        state.pop(cover_dir, None)
+    if current != seen:
+        _write_json(SUPERSEDED_PATH, state)
+    return deleted
+
+
+def publish_all(db_path, cover_dir, plain_covers: dict, grace_days: float = GC_GRACE_DAYS) -> None:
+    """Publish {filename: plain cover path}, record the names in db_path and collect superseded versions."""
+    covers = {filename: publish(path) for filename, path in plain_covers.items()}
+    covers = {filename: name for filename, name in covers.items() if name}
+    changed = record_covers(db_path, covers) if os.path.isfile(db_path) else 0
+    deleted = collect_garbage(cover_dir, db_path, grace_days)
+    print(f"Hashed covers: {len(covers)} published, {changed} db.json entr{'y' if changed == 1 else 'ies'} updated, "
+          f"{len(deleted)} superseded version(s) deleted")
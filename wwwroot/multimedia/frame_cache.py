@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Shared cache of the opening frames of each video, so cover extraction, OCR
+title parsing and title-screen analysis decode a video's start only once.
+
+Entries are keyed by the SHA-256 of the video content (hashes are remembered
+per path/size/mtime, so unchanged files are not re-hashed) and stored as:
+  <cache>/<hash>/full.npy   first FULL_FRAMES frames, BGR, full resolution
+  <cache>/<hash>/small.npy  first N seconds, grayscale, longer side SMALL_MAX_SIDE
+  <cache>/<hash>/meta.json  fps, sizes, frame counts, seconds cached
+Arrays are opened memory-mapped (np.load(mmap_mode="r")), so reading a cached
+entry costs almost nothing.
+
+Cache location: $FRAME_CACHE_DIR, default .cache/frames at the repo root
+(outside wwwroot so it is never served).
+
+Requires opencv-python-headless and numpy.
+
+Usage:
+  python3 frame_cache.py warm <video> [...]   # decode openings in parallel
+  python3 frame_cache.py prune [--max-mb 2048]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[2] / ".cache" / "frames"
+DEFAULT_SECONDS = 10.0   # matches analyze_title_screen(max_seconds)
+SMALL_MAX_SIDE = 256
+FULL_FRAMES = 1          # covers and OCR only need the first frame
+HASH_CHUNK = 1024 * 1024
+FALLBACK_FPS = 25.0
+
+
+class CachedFrames:
+    """Memory-mapped frames of one video's opening."""
+
+    def __init__(self, entry_dir: Path):
+        with open(entry_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.fps = self.meta["fps"]
+        self.full = np.load(entry_dir / "full.npy", mmap_mode="r")
+        self.small = np.load(entry_dir / "small.npy", mmap_mode="r")
+
+    @property
+    def first_frame(self) -> Optional[np.ndarray]:
+        """First frame (BGR, full resolution) as a regular array, or None."""
+        return np.array(self.full[0]) if len(self.full) else None
+
+
+class FrameCache:
+    def __init__(self, cache_dir=None, seconds: float = DEFAULT_SECONDS,
+                 small_max_side: int = SMALL_MAX_SIDE, full_frames: int = FULL_FRAMES):
+        self.cache_dir = Path(cache_dir or os.environ.get("FRAME_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.seconds = seconds
+        self.small_max_side = small_max_side
+        self.full_frames = full_frames
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._index_path = self.cache_dir / "hashes.json"
+        self._index = None
+
+    # ---- content hashes -------------------------------------------------
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def video_hash(self, video_path) -> str:
+        """SHA-256 of the file content, remembered per (path, size, mtime)."""
+        path = Path(video_path).resolve()
+        st = path.stat()
+        sig = [st.st_size, st.st_mtime_ns]
+        with self._lock:
+            known = self._load_index().get(str(path))
+            if known and known["sig"] == sig:
+                return known["sha256"]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self._load_index()[str(path)] = {"sig": sig, "sha256": digest}
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._index, f, ensure_ascii=False)
+            os.replace(tmp, self._index_path)
+        return digest
+
+    # ---- frames ---------------------------------------------------------
+
+    def _entry_ok(self, entry_dir: Path, seconds: float) -> bool:
+        try:
+            with open(entry_dir / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return (
+            meta.get("smallMaxSide") == self.small_max_side
+            and (meta.get("fullFrames", 0) >= self.full_frames or meta.get("reachedEnd"))
+            and (meta.get("seconds", 0) >= seconds or meta.get("reachedEnd"))
+        )
+
+    def get(self, video_path, seconds: Optional[float] = None) -> Optional[CachedFrames]:
+        """
+        Return the cached opening of video_path (at least `seconds` long, or the
+        whole video if shorter), decoding it once on a miss. None if unreadable.
+        """
+        seconds = max(seconds or 0.0, self.seconds)
+        digest = self.video_hash(video_path)
+        entry_dir = self.cache_dir / digest
+        with self._lock:
+            key_lock = self._key_locks.setdefault(digest, threading.Lock())
+        with key_lock:
+            if not self._entry_ok(entry_dir, seconds):
+                if not self._decode(Path(video_path), entry_dir, seconds):
+                    return None
+        return CachedFrames(entry_dir)
+
+    def first_frame(self, video_path) -> Optional[np.ndarray]:
+        cached = self.get(video_path)
+        return cached.first_frame if cached is not None else None
+
+    def _decode(self, video_path: Path, entry_dir: Path, seconds: float) -> bool:
+        cap = cv2.VideoCapture(str(video_path))
+        if not cap.isOpened():
+            return False
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        if fps <= 0:
+            fps = FALLBACK_FPS
+        max_frames = max(1, int(seconds * fps))
+        full, small = [], []
+        reached_end = False
+        width = height = 0
+        small_size = None
+        while len(small) < max_frames:
+            ok, frame = cap.read()
+            if not ok or frame is None:
+                reached_end = True
+                break
+            if small_size is None:
+                height, width = frame.shape[:2]
+                scale = min(1.0, self.small_max_side / max(width, height))
+                small_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            if len(full) < self.full_frames:
+                full.append(frame)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            small.append(cv2.resize(gray, small_size, interpolation=cv2.INTER_AREA))
+        cap.release()
+        if not small:
+            return False
+
+        meta = {
+            "source": video_path.name,
+            "fps": fps,
+            "width": width,
+            "height": height,
+            "seconds": len(small) / fps,
+            "smallMaxSide": self.small_max_side,
+            "fullFrames": len(full),
+            "reachedEnd": reached_end,
+        }
+        # Build in a temp dir, then swap in, so readers never see a partial entry
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-"))
+        try:
+            np.save(tmp_dir / "full.npy", np.stack(full))
+            np.save(tmp_dir / "small.npy", np.stack(small))
+            with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return True
+
+    def prune(self, max_mb: float) -> int:
+        """Drop least recently used entries until the cache fits in max_mb. Returns entries removed."""
+        entries = []
+        for d in self.cache_dir.glob("*/meta.json"):
+            files = list(d.parent.iterdir())
+            size = sum(f.stat().st_size for f in files)
+            used = max(f.stat().st_atime for f in files)
+            entries.append((used, size, d.parent))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry_dir in sorted(entries):
+            if total <= max_mb * 1024 * 1024:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+_default_cache = None
+
+
+def default_cache() -> FrameCache:
+    """Process-wide FrameCache used by the cover/OCR/title-screen tools."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = FrameCache()
+    return _default_cache
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Shared first-frames cache for video tools.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    warm = sub.add_parser("warm", help="Decode and cache the opening of each video.")
+    warm.add_argument("videos", nargs="+")
+    warm.add_argument("--seconds", type=float, default=DEFAULT_SECONDS)
+    warm.add_argument("--workers", type=int, default=2)
+    prune = sub.add_parser("prune", help="Remove least recently used entries.")
+    prune.add_argument("--max-mb", type=float, default=2048)
+    args = ap.parse_args()
+
+    cache = default_cache()
+    if args.cmd == "prune":
+        print(f"Removed {cache.prune(args.max_mb)} entries from {cache.cache_dir}")
+        return
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for path, cached in zip(args.videos, pool.map(lambda p: cache.get(p, args.seconds), args.videos)):
+            if cached is None:
+                print(f"- {path}: could not decode")
+            else:
+                print(f"- {path}: {len(cached.small)} frame(s) @ {cached.fps:.2f}fps cached")
+
+
+if __name__ == "__main__":
+    main()
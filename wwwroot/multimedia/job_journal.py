@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Crash-safe write-ahead journal for the batch media tools
+(lsLearns/trim_title_screens.py, music/compress_video.py and the cover scripts).
+
+Each tool appends one JSON line per state change and fsyncs it before acting:
+  planned      job known, with input path, input SHA-256 and parameters
+  in-progress  work started; re-logged with outputHash once the output is
+               complete but before it is moved into place
+  done         output in place (outputHash recorded)
+  failed       work raised or returned False
+Outputs are written to a .part file and os.replace()d, so a file is either
+the old version or the complete new one. After a crash, the journal tells
+which jobs finished, which were interrupted, and — for in-place edits such as
+trimming — whether a file on disk is already the output of a job (its hash
+equals the recorded outputHash), so the job is never applied twice.
+
+Jobs on files are keyed by job_key(path), the path relative to the repo root,
+so same-named files in different folders are separate jobs.
+
+Journals live in $JOB_JOURNAL_DIR, default .cache/journals at the repo root.
+
+Usage (inspect a journal):
+  python3 job_journal.py trim_title_screens
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_JOURNAL_DIR = REPO_ROOT / ".cache" / "journals"
+HASH_CHUNK = 1024 * 1024
+COMPACT_MIN_LINES = 200   # rewrite the journal when it has this many more lines than completed jobs
+
+
+def job_key(path) -> str:
+    """
+    Journal key for a file: its path relative to the repo root (absolute if
+    outside it), so files with the same name in different folders never share a job.
+    """
+    p = Path(path).resolve()
+    try:
+        return p.relative_to(REPO_ROOT).as_posix()
+    except ValueError:
+        return p.as_posix()
+
+
+def partial_path(path) -> str:
+    """Temporary output path next to path, keeping the extension (ffmpeg/PIL pick the format from it)."""
+    root, ext = os.path.splitext(str(path))
+    return f"{root}.part{ext}"
+
+
+class JobJournal:
+    def __init__(self, tool: str, path=None):
+        self.tool = tool
+        directory = Path(os.environ.get("JOB_JOURNAL_DIR") or DEFAULT_JOURNAL_DIR)
+        self.path = Path(path) if path else directory / f"{tool}.jsonl"
+        self.jobs = {}        # key -> latest record of the job (fields merged within one run)
+        self.completed = {}   # key -> last done record
+        self.run_info = None  # last run header
+        self.run_id = None    # run this process appends to
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._replay()
+
+    # ---- replay / append -------------------------------------------------
+
+    def _apply(self, rec: dict) -> None:
+        self._lines += 1
+        if rec.get("state") == "run":
+            self.run_info = rec
+            return
+        key = rec["key"]
+        prev = self.jobs.get(key)
+        merged = {**prev, **rec} if prev and prev.get("run") == rec.get("run") else rec
+        self.jobs[key] = merged
+        if merged["state"] == "done":
+            self.completed[key] = merged
+
+    def _replay(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        for line in data.splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError):
+                continue  # torn write from a crash
+        if data and not data.endswith(b"\n"):
+            with open(self.path, "ab") as f:
+                f.write(b"\n")
+
+    def _append(self, rec: dict) -> None:
+        rec = {"t": round(time.time(), 3), "run": self.run_id, **rec}
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(rec)
+
+    def _compact(self) -> None:
+        """
+        Keep only the last done record per job, and in-progress records whose
+        output may already be in place (atomic rewrite).
+        """
+        if self._lines < len(self.completed) + COMPACT_MIN_LINES:
+            return
+        moved = {key: rec for key, rec in self.jobs.items() if rec["state"] == "in-progress" and rec.get("outputHash")}
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec in [*self.completed.values(), *moved.values()]:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.jobs = {**self.completed, **moved}
+        self.run_info = None
+        self._lines = len(self.completed) + len(moved)
+
+    # ---- runs ------------------------------------------------------------
+
+    def start_run(self, **params) -> None:
+        """Begin a new run; params (e.g. a backup folder) are kept for --resume."""
+        self._compact()
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._append({"state": "run", "tool": self.tool, "params": params})
+
+    def unfinished(self) -> list:
+        """Jobs of the last run that were planned but never completed, in plan order."""
+        if self.run_info is None:
+            return []
+        run = self.run_info["run"]
+        return [rec for rec in self.jobs.values() if rec.get("run") == run and rec["state"] != "done"]
+
+    def resume_run(self) -> dict:
+        """Continue appending to the last run; return its params."""
+        self.run_id = self.run_info["run"]
+        return self.run_info.get("params", {})
+
+    # ---- jobs ------------------------------------------------------------
+
+    def file_hash(self, path) -> str:
+        """SHA-256 of a file, remembered per (path, size, mtime) for this process."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        sig = (path, st.st_size, st.st_mtime_ns)
+        if sig not in self._hashes:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                    h.update(chunk)
+            self._hashes[sig] = h.hexdigest()
+        return self._hashes[sig]
+
+    def plan(self, key: str, input_path, params: Optional[dict] = None) -> None:
+        if self.run_id is None:
+            self.start_run()
+        self._append({"key": key, "state": "planned", "input": os.path.abspath(input_path),
+                      "inputHash": self.file_hash(input_path), "params": params or {}})
+
+    def up_to_date(self, key: str, output_path, input_path=None, params: Optional[dict] = None) -> bool:
+        """
+        True if output_path is the output of a completed job `key`: its hash matches,
+        and (when given) the input is unchanged and the parameters are the same.
+        A job interrupted between moving its output into place and logging done
+        counts as completed, so in-place work is never applied twice.
+        """
+        rec = self.completed.get(key)
+        latest = self.jobs.get(key)
+        if latest is not None and latest["state"] == "in-progress" and latest.get("outputHash"):
+            rec = latest
+        if rec is None or not os.path.exists(output_path):
+            return False
+        if params is not None and rec.get("params") != json.loads(json.dumps(params)):
+            return False
+        if (input_path is not None and os.path.abspath(input_path) != os.path.abspath(output_path)
+                and self.file_hash(input_path) != rec.get("inputHash")):
+            return False
+        return self.file_hash(output_path) == rec.get("outputHash")
+
+    def run(self, key: str, input_path, output_path, work: Callable[[str], bool],
+            params: Optional[dict] = None) -> bool:
+        """
+        Run work(partial_output_path) -> bool as a journaled job and move its
+        output to output_path. Uses the planned parameters if the job was planned
+        in this run. A job interrupted after its output was moved into place is
+        marked done without running again.
+        """
+        rec = self.jobs.get(key)
+        if rec is None or self.run_id is None or rec.get("run") != self.run_id:
+            self.plan(key, input_path, params)
+            rec = self.jobs[key]
+        if (rec.get("outputHash") and os.path.exists(output_path)
+                and self.file_hash(output_path) == rec["outputHash"]):
+            self._append({"key": key, "state": "done"})
+            return True
+
+        self._append({"key": key, "state": "in-progress"})
+        tmp = partial_path(output_path)
+        try:
+            ok = work(tmp) and os.path.exists(tmp)
+        except Exception as e:
+            self._append({"key": key, "state": "failed", "error": str(e)})
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        if not ok:
+            self._append({"key": key, "state": "failed"})
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        digest = self.file_hash(tmp)
+        self._append({"key": key, "state": "in-progress", "outputHash": digest})
+        os.replace(tmp, output_path)
+        self._append({"key": key, "state": "done", "outputHash": digest})
+        return True
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Show the state of a batch tool's job journal.")
+    ap.add_argument("tool", help="Journal name, e.g. trim_title_screens, compress_video, extract_covers-music")
+    args = ap.parse_args()
+
+    journal = JobJournal(args.tool)
+    if not journal.path.exists():
+        print(f"No journal at {journal.path}")
+        return
+    counts = {}
+    for rec in journal.jobs.values():
+        counts[rec["state"]] = counts.get(rec["state"], 0) + 1
+    print(f"{journal.path}: {len(journal.jobs)} job(s) " + ", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+    for rec in journal.unfinished():
+        print(f"  unfinished: {rec['key']} ({rec['state']})")
+
+
+if __name__ == "__main__":
+    main()
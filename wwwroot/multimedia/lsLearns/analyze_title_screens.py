@@ -8,14 +8,20 @@ Heuristic:
 - For subsequent frames, compute mean absolute difference vs the first frame.
 - As soon as the difference exceeds a small threshold, we consider that
   motion/content has started, and the title screen ended on the previous frame.
+
+Frames come from the shared frame cache (../frame_cache.py): the reduced
+grayscale frames of the opening are decoded once per video and reused by the
+cover and OCR tools; the differences are computed for all frames at once.
 """
 
-import os
+import sys
 from pathlib import Path
 
-import cv2
 import numpy as np
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # shared frame_cache.py
+from frame_cache import default_cache
+
 
 VIDEO_DIR = Path(__file__).parent / "videos"
 
@@ -27,44 +33,23 @@ def analyze_title_screen(video_path: Path, max_seconds: float = 10.0, diff_thres
     - static_frames: how many initial frames are (nearly) identical to the first frame.
 
     - max_seconds: safety cap so we don't scan entire long videos.
-    - diff_threshold: mean absolute difference threshold (0-255 scale).
+    - diff_threshold: mean absolute difference threshold (0-255 scale),
+      measured on the cache's reduced grayscale frames.
     """
-    cap = cv2.VideoCapture(str(video_path))
-    if not cap.isOpened():
+    cached = default_cache().get(video_path, seconds=max_seconds)
+    if cached is None:
         print(f"{video_path.name}: could not open video")
         return 0.0, -1
 
-    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
-    if fps <= 0:
-        fps = 25.0  # reasonable fallback
-
+    fps = cached.fps
     max_frames = int(max_seconds * fps)
+    frames = cached.small[:max(1, max_frames)]
 
-    ret, first = cap.read()
-    if not ret or first is None:
-        print(f"{video_path.name}: could not read first frame")
-        cap.release()
-        return fps, -1
-
-    first_gray = cv2.cvtColor(first, cv2.COLOR_BGR2GRAY)
-
-    static_frames = 1  # count the very first frame
-    frame_idx = 1
-
-    while frame_idx < max_frames:
-        ret, frame = cap.read()
-        if not ret or frame is None:
-            break
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        diff = cv2.absdiff(first_gray, gray)
-        mean_diff = float(np.mean(diff))
-        if mean_diff > diff_threshold:
-            # Motion/content started at this frame
-            break
-        static_frames += 1
-        frame_idx += 1
-
-    cap.release()
+    first = frames[0].astype(np.int16)
+    diffs = np.abs(frames[1:].astype(np.int16) - first).mean(axis=(1, 2))
+    moving = np.flatnonzero(diffs > diff_threshold)
+    # Motion/content started at the first frame over the threshold
+    static_frames = 1 + (int(moving[0]) if moving.size else len(diffs))
     return fps, static_frames
 
 
@@ -1,13 +1,30 @@
 #!/usr/bin/env python3
 """
-Extract the first frame of each MP4 in videos/ and save as covers_generated/xxx_cover.png.
-Uses ffmpeg if available, otherwise OpenCV (cv2). For OpenCV: pip install opencv-python-headless
+Extract the first frame of each MP4 in cn/videos/ and en/videos/ (and videos/, if present)
+and save as covers_generated/xxx_cover.png next to it.
+Uses ffmpeg if available, otherwise OpenCV (cv2) through the shared frame cache
+(../frame_cache.py), so the opening is decoded once and reused by the title-screen and
+OCR tools. For OpenCV: pip install opencv-python-headless
+
+Covers are written through the job journal (../job_journal.py); with --resume,
+covers already extracted from the unchanged video are skipped.
+
+With --hashed-names, covers are also published as xxx_cover.<hash8>.webp and
+recorded in the folder's db.json as "cover" (see ../cover_names.py).
 """
+import argparse
 import os
 import shutil
 import subprocess
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # shared frame_cache.py, job_journal.py, cover_names.py
+
+from cover_names import GC_GRACE_DAYS, hashed_names_enabled, publish_all
+from job_journal import JobJournal
+
+SECTIONS = ("cn", "en")
+
 def has_ffmpeg():
     return shutil.which("ffmpeg") is not None
 
@@ -26,15 +43,18 @@ def extract_with_ffmpeg(mp4: str, out: str) -> bool:
 def extract_with_opencv(mp4: str, out: str) -> bool:
     try:
         import cv2
+        from frame_cache import default_cache
     except ImportError:
         return False
-    cap = cv2.VideoCapture(mp4)
-    ok, frame = cap.read()
-    cap.release()
-    if not ok or frame is None:
+    frame = default_cache().first_frame(mp4)
+    if frame is None:
         return False
     return cv2.imwrite(out, frame)
 
+def extract_cover(mp4: str, out: str) -> bool:
+    """ffmpeg first (as before the frame cache, so existing covers do not change), cached OpenCV frame as fallback."""
+    return (has_ffmpeg() and extract_with_ffmpeg(mp4, out)) or extract_with_opencv(mp4, out)
+
 def _has_opencv():
     try:
         import cv2
@@ -43,6 +63,13 @@ def _has_opencv():
         return False
 
 def main():
+    ap = argparse.ArgumentParser(description="Extract covers for cn/videos/ and en/videos/ into covers_generated/.")
+    ap.add_argument("--resume", action="store_true", help="Skip covers the job journal shows are up to date.")
+    ap.add_argument("--hashed-names", action="store_true",
+                    help="Also publish content-hashed covers and record them in db.json (stays on once recorded).")
+    ap.add_argument("--gc-grace-days", type=float, default=GC_GRACE_DAYS,
+                    help=f"Delete superseded hashed covers after this many days (default {GC_GRACE_DAYS}).")
+    args = ap.parse_args()
     if not has_ffmpeg() and not _has_opencv():
         print("Neither ffmpeg nor OpenCV (cv2) is available.")
         print("Install one of them:")
@@ -50,30 +77,40 @@ def main():
         print("  OpenCV: pip3 install opencv-python-headless")
         sys.exit(1)
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    video_dir = os.path.join(script_dir, "videos")
-    out_dir = os.path.join(script_dir, "covers_generated")
-    os.makedirs(out_dir, exist_ok=True)
-    if not os.path.isdir(video_dir):
+    journal = JobJournal("extract_covers-lsLearns")
+    # (folder, journal key prefix): the language folders, plus the old single-folder layout
+    folders = [(os.path.join(script_dir, s), s + "/") for s in SECTIONS] + [(script_dir, "")]
+    folders = [(f, prefix) for f, prefix in folders if os.path.isdir(os.path.join(f, "videos"))]
+    if not folders:
         print("No videos/ folder found.")
         return
-    mp4_files = [f for f in os.listdir(video_dir) if f.lower().endswith((".mp4", ".m4v"))]
-    if not mp4_files:
-        print("No .mp4 files found in videos/.")
-        return
-    for mp4 in sorted(mp4_files):
-        base, _ = os.path.splitext(mp4)
-        mp4_path = os.path.join(video_dir, mp4)
-        out_path = os.path.join(out_dir, base + "_cover.png")
-        print("Extracting:", mp4, "->", out_path)
-        ok = False
-        if has_ffmpeg():
-            ok = extract_with_ffmpeg(mp4_path, out_path)
-        if not ok:
-            ok = extract_with_opencv(mp4_path, out_path)
-        if not ok:
-            print("  FAILED")
-        else:
-            print("  OK")
+    for folder, prefix in folders:
+        video_dir = os.path.join(folder, "videos")
+        out_dir = os.path.join(folder, "covers_generated")
+        mp4_files = [f for f in os.listdir(video_dir) if f.lower().endswith((".mp4", ".m4v"))]
+        if not mp4_files:
+            print(f"No .mp4 files found in {prefix}videos/.")
+            continue
+        os.makedirs(out_dir, exist_ok=True)
+        plain_covers = {}
+        for mp4 in sorted(mp4_files):
+            base, _ = os.path.splitext(mp4)
+            mp4_path = os.path.join(video_dir, mp4)
+            out_path = os.path.join(out_dir, base + "_cover.png")
+            plain_covers[mp4] = out_path
+            key = prefix + mp4
+            print("Extracting:", key, "->", out_path)
+            if args.resume and journal.up_to_date(key, out_path, mp4_path):
+                print("  up to date (job journal), skipping")
+                continue
+            ok = journal.run(key, mp4_path, out_path, lambda tmp: extract_cover(mp4_path, tmp))
+            if not ok:
+                print("  FAILED")
+            else:
+                print("  OK")
+        db_path = os.path.join(folder, "db.json")
+        if hashed_names_enabled(db_path, args.hashed_names):
+            publish_all(db_path, out_dir, plain_covers, args.gc_grace_days)
     print("Done.")
 
 if __name__ == "__main__":
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Build a chapter index for each lsLearns lesson and store it in db.json.
+
+Each video is streamed once, sampled at ANALYSIS_FPS, grayscale, longer side
+ANALYSIS_MAX_SIDE (ffmpeg scales in the decoder pipe; OpenCV grab() skips
+unsampled frames without converting them). Frames arrive in fixed-size chunks,
+so memory is constant regardless of video length. Per chunk, NumPy computes
+for all consecutive frame pairs at once:
+- mean absolute difference (0-255), and
+- half L1 distance of HIST_BINS-bin histograms (0-1).
+
+Hysteresis on those scores finds slide/scene changes: a change starts when
+either score rises above its HIGH threshold and ends only once both fall below
+LOW. The settled frame must then also differ from the previous chapter's frame
+(so animations that return to the same slide are not chapters), and chapters
+shorter than MIN_CHAPTER_SECONDS are merged.
+
+db.json entries get:
+  "chapters": [{"startInSeconds": 12.4, "thumbnail": "chapters_generated/<stem>_ch02.jpg"}, ...]
+(the manager's refresh in Program.cs keeps this field when it rebuilds the entries).
+Thumbnails (THUMB_WIDTH wide) are taken from the settled frame of each chapter.
+
+Requires opencv-python-headless and numpy; ffmpeg is used when available.
+
+Usage:
+  python3 index_scenes.py                 # cn and en; skips videos already indexed
+  python3 index_scenes.py cn --force --workers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent
+SECTIONS = ("cn", "en")
+FALLBACK_SECTION = "cn"     # en lessons without their own video use the cn one
+VIDEO_EXTENSIONS = {".mp4", ".m4v"}
+
+ANALYSIS_FPS = 5.0
+ANALYSIS_MAX_SIDE = 160
+CHUNK_FRAMES = 64           # frames per chunk (under 3MB even for 160x284 vertical video)
+HIST_BINS = 32
+
+# Hysteresis thresholds on consecutive-frame scores
+MAD_HIGH, MAD_LOW = 8.0, 2.0
+HIST_HIGH, HIST_LOW = 0.15, 0.03
+# A settled frame starts a chapter only if it differs this much from the previous chapter's frame
+MAD_CUT, HIST_CUT = 10.0, 0.10
+MIN_CHAPTER_SECONDS = 5.0
+
+THUMB_WIDTH = 320
+THUMB_DIR = "chapters_generated"
+
+
+def _read_exact(stream, view: memoryview) -> int:
+    """Fill view from stream (pipes return short reads); return bytes read."""
+    total = 0
+    while total < len(view):
+        n = stream.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+def _analysis_size(width: float, height: float, max_side: int) -> tuple[int, int]:
+    scale = min(1.0, max_side / max(width, height))
+    # even sizes keep ffmpeg's scaler happy
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+
+def _ffmpeg_chunks(video_path: Path, sample_fps: float, size: tuple[int, int]):
+    w, h = size
+    cmd = [
+        "ffmpeg", "-v", "error", "-nostdin", "-i", str(video_path), "-an", "-sn",
+        "-vf", f"fps={sample_fps},scale={w}:{h}:flags=area,format=gray",
+        "-f", "rawvideo", "-",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    buf = bytearray(CHUNK_FRAMES * w * h)
+    view = memoryview(buf)
+    index = 0
+    try:
+        while True:
+            n = _read_exact(proc.stdout, view) // (w * h)
+            if n == 0:
+                break
+            frames = np.frombuffer(buf, dtype=np.uint8, count=n * w * h).reshape(n, h, w)
+            yield np.arange(index, index + n) / sample_fps, frames
+            index += n
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def _opencv_chunks(cap, fps: float, sample_fps: float, size: tuple[int, int]):
+    w, h = size
+    step = max(1, int(round(fps / sample_fps)))
+    frames = np.empty((CHUNK_FRAMES, h, w), dtype=np.uint8)
+    times = np.empty(CHUNK_FRAMES)
+    n = 0
+    index = 0
+    while cap.grab():
+        if index % step == 0:
+            ok, frame = cap.retrieve()
+            if ok:
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                frames[n] = cv2.resize(gray, (w, h), interpolation=cv2.INTER_AREA)
+                times[n] = index / fps
+                n += 1
+                if n == CHUNK_FRAMES:
+                    yield times.copy(), frames
+                    n = 0
+        index += 1
+    if n:
+        yield times[:n].copy(), frames[:n]
+
+
+def stream_gray_chunks(video_path: Path, sample_fps: float = ANALYSIS_FPS, max_side: int = ANALYSIS_MAX_SIDE):
+    """
+    Yield (times, frames) chunks of up to CHUNK_FRAMES grayscale frames
+    (longer side max_side) sampled at sample_fps. The frames buffer is reused
+    between chunks; copy what must outlive the iteration. Yields nothing if
+    the video cannot be opened.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    size = _analysis_size(cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT), max_side)
+    try:
+        if shutil.which("ffmpeg"):
+            cap.release()
+            yield from _ffmpeg_chunks(video_path, sample_fps, size)
+        else:
+            yield from _opencv_chunks(cap, fps, sample_fps, size)
+    finally:
+        cap.release()
+
+
+def chunk_scores(prev: Optional[np.ndarray], frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scores between consecutive frames of prev + frames (one pair per frame of
+    `frames`, or one fewer without prev): (mean abs diff, histogram distance).
+    """
+    seq = frames if prev is None else np.concatenate([prev[None], frames])
+    n = len(seq)
+    mad = np.abs(np.diff(seq.astype(np.int16), axis=0)).mean(axis=(1, 2))
+    shift = 8 - int(np.log2(HIST_BINS))
+    bins = (seq >> shift).reshape(n, -1).astype(np.int64) + (np.arange(n) * HIST_BINS)[:, None]
+    hist = np.bincount(bins.ravel(), minlength=n * HIST_BINS).reshape(n, HIST_BINS) / seq[0].size
+    hist_dist = 0.5 * np.abs(np.diff(hist, axis=0)).sum(axis=1)
+    return mad, hist_dist
+
+
+def _differs(a: np.ndarray, b: np.ndarray) -> bool:
+    mad, hist_dist = chunk_scores(a, b[None])
+    return mad[0] > MAD_CUT or hist_dist[0] > HIST_CUT
+
+
+class ChapterDetector:
+    """Hysteresis state machine over frame scores; keeps O(1) state (one reference frame)."""
+
+    def __init__(self):
+        self.chapters = [[0.0, 0.0]]   # [start, settled (thumbnail) time]
+        self.changing = False
+        self.change_start = 0.0
+        self.reference = None          # settled frame of the current chapter
+
+    def feed(self, times: np.ndarray, frames: np.ndarray, mad: np.ndarray, hist_dist: np.ndarray) -> None:
+        # scores[i] compares frames[i] with its predecessor
+        offset = len(frames) - len(mad)
+        if self.reference is None:
+            self.reference = frames[0].copy()
+        high = (mad > MAD_HIGH) | (hist_dist > HIST_HIGH)
+        low = (mad < MAD_LOW) & (hist_dist < HIST_LOW)
+        for i in range(len(mad)):
+            t = float(times[i + offset])
+            if not self.changing:
+                if high[i]:
+                    self.changing = True
+                    self.change_start = t
+                continue
+            if not low[i]:
+                continue
+            self.changing = False
+            frame = frames[i + offset]
+            if not _differs(self.reference, frame):
+                continue
+            if self.change_start - self.chapters[-1][0] < MIN_CHAPTER_SECONDS:
+                # Too short to be its own chapter: the earlier one just moves on to this view
+                self.chapters[-1][1] = t
+            else:
+                self.chapters.append([self.change_start, t])
+            self.reference = frame.copy()
+
+
+def detect_chapters(video_path: Path) -> Optional[list[tuple[float, float]]]:
+    """Return [(start, thumbnail_time)] for video_path, or None if unreadable."""
+    detector = ChapterDetector()
+    prev = None
+    seen = False
+    for times, frames in stream_gray_chunks(video_path):
+        mad, hist_dist = chunk_scores(prev, frames)
+        detector.feed(times, frames, mad, hist_dist)
+        prev = frames[-1].copy()
+        seen = True
+    if not seen:
+        return None
+    return [(round(start, 2), round(thumb, 2)) for start, thumb in detector.chapters]
+
+
+def write_thumbnails(video_path: Path, chapters: list, out_dir: Path, stem: str) -> list[str]:
+    """Save one THUMB_WIDTH-wide JPEG per chapter; return paths relative to the section folder."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cap = cv2.VideoCapture(str(video_path))
+    paths = []
+    try:
+        for n, (_, thumb_time) in enumerate(chapters, 1):
+            name = f"{stem}_ch{n:02d}.jpg"
+            cap.set(cv2.CAP_PROP_POS_MSEC, thumb_time * 1000.0)
+            ok, frame = cap.read()
+            if not ok or frame is None:
+                paths.append(None)
+                continue
+            h, w = frame.shape[:2]
+            thumb = cv2.resize(frame, (THUMB_WIDTH, max(1, round(h * THUMB_WIDTH / w))), interpolation=cv2.INTER_AREA)
+            cv2.imwrite(str(out_dir / name), thumb, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            paths.append(f"{THUMB_DIR}/{name}")
+    finally:
+        cap.release()
+    return paths
+
+
+def index_video(video_path: Path, section_dir: Path) -> Optional[list[dict]]:
+    chapters = detect_chapters(video_path)
+    if chapters is None:
+        return None
+    thumbs = write_thumbnails(video_path, chapters, section_dir / THUMB_DIR, video_path.stem)
+    return [
+        {"startInSeconds": start, **({"thumbnail": thumb} if thumb else {})}
+        for (start, _), thumb in zip(chapters, thumbs)
+    ]
+
+
+def resolve_video(section_dir: Path, filename: str) -> Optional[Path]:
+    for d in (section_dir / "videos", ROOT / FALLBACK_SECTION / "videos"):
+        p = d / filename
+        if p.is_file():
+            return p
+    return None
+
+
+def _is_indexed(section_dir: Path, item: dict) -> bool:
+    chapters = item.get("chapters")
+    return bool(chapters) and all((section_dir / c["thumbnail"]).is_file() for c in chapters if c.get("thumbnail"))
+
+
+def write_db(db_path: Path, db: dict) -> None:
+    """Write db.json atomically."""
+    fd, tmp = tempfile.mkstemp(prefix=".db.", suffix=".json", dir=db_path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(db, f, ensure_ascii=False, indent=2)
+        os.chmod(tmp, db_path.stat().st_mode & 0o777)
+        os.replace(tmp, db_path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Detect chapters in lsLearns lessons and store them in db.json.")
+    ap.add_argument("sections", nargs="*", default=list(SECTIONS), help="Sections to index (default: cn en).")
+    ap.add_argument("--force", action="store_true", help="Re-index videos that already have chapters.")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                    help="Videos analysed in parallel.")
+    ap.add_argument("--dry-run", action="store_true", help="Print chapters, do not write thumbnails or db.json.")
+    args = ap.parse_args()
+
+    for section in args.sections:
+        section_dir = ROOT / section
+        db_path = section_dir / "db.json"
+        if not db_path.is_file():
+            print(f"db.json not found: {db_path}")
+            continue
+        with open(db_path, "r", encoding="utf-8") as f:
+            db = json.load(f)
+
+        jobs = []
+        for item in db.get("list", []):
+            name = item.get("filename", "")
+            if Path(name).suffix.lower() not in VIDEO_EXTENSIONS:
+                continue
+            if not args.force and _is_indexed(section_dir, item):
+                continue
+            video = resolve_video(section_dir, name)
+            if video is None:
+                print(f"- {section}/{name}: video not found, skipping")
+                continue
+            jobs.append((item, video))
+        if not jobs:
+            print(f"{section}: nothing to index")
+            continue
+
+        def run(job):
+            item, video = job
+            if args.dry_run:
+                chapters = detect_chapters(video)
+                return chapters and [{"startInSeconds": start} for start, _ in chapters]
+            return index_video(video, section_dir)
+
+        print(f"{section}: indexing {len(jobs)} video(s) with {args.workers} worker(s)...")
+        updated = 0
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            for (item, video), chapters in zip(jobs, pool.map(run, jobs)):
+                if chapters is None:
+                    print(f"- {video.name}: could not decode")
+                    continue
+                starts = ", ".join(f"{c['startInSeconds']:.1f}" for c in chapters)
+                print(f"- {video.name}: {len(chapters)} chapter(s) at {starts}s")
+                item["chapters"] = chapters
+                updated += 1
+        if updated and not args.dry_run:
+            write_db(db_path, db)
+            print(f"Updated {updated} entries in {db_path}")
+
+
+if __name__ == "__main__":
+    main()
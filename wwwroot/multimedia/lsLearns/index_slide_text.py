@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Build a full-text search index of the slide text in the cn and en lessons.
+
+Only distinct slides are OCR'd. Each video is streamed once at GATE_FPS,
+grayscale, longer side GATE_MAX_SIDE (index_scenes.stream_gray_chunks), and a
+frame is selected when it is static (mean abs diff to its predecessor below
+STABLE_MAD) and differs from the last selected frame in more than
+NEW_SLIDE_FRACTION of its pixels. Only those frames are read at full
+resolution and passed to easyocr (ch_sim + en, as in rename_by_title.py).
+
+OCR results are cached per video content hash (frame_cache.video_hash) in
+$SLIDE_TEXT_CACHE_DIR, default .cache/slide_text at the repo root, so only new
+or changed videos are OCR'd again; the index itself is rebuilt from the cache
+every run, which takes seconds.
+
+Index (lsLearns/search_index/, loaded lazily by the front end):
+  index.json         {"docs": [{"section", "filename"}], "shards": N, "files": [...]}
+  shard_XX.json.gz   {token: [[doc, [seconds, ...]], ...]} for tokens whose first
+                     code point % N == XX (gzip; read with DecompressionStream)
+Tokens: Chinese runs become character bigrams (a lone character is kept as is),
+Latin text becomes lowercase [a-z0-9] words; text is NFKC-normalised first. A
+query is tokenised the same way and the postings of its tokens intersected.
+
+Usage:
+  python3 index_slide_text.py                # OCR new videos, rebuild index
+  python3 index_slide_text.py --force        # re-OCR everything
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # shared frame_cache.py
+from frame_cache import default_cache
+from index_scenes import SECTIONS, VIDEO_EXTENSIONS, resolve_video, stream_gray_chunks
+
+ROOT = Path(__file__).resolve().parent
+INDEX_DIR = ROOT / "search_index"
+CACHE_DIR = Path(os.environ.get("SLIDE_TEXT_CACHE_DIR") or ROOT.parents[2] / ".cache" / "slide_text")
+CACHE_VERSION = 1           # bump when gating or OCR settings change
+
+GATE_FPS = 2.0
+GATE_MAX_SIDE = 320         # small text must still register as changed pixels
+STABLE_MAD = 1.0            # frame is static if it differs less than this from its predecessor
+CHANGED_PIXEL_DELTA = 24    # a pixel changed if it moved more than this (0-255)
+NEW_SLIDE_FRACTION = 0.005  # new slide if more than this fraction of pixels changed
+MIN_CONFIDENCE = 0.3
+SHARDS = 16
+
+CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def select_slide_times(video_path: Path) -> Optional[list[float]]:
+    """Times (seconds) of distinct static frames, or None if the video cannot be read."""
+    selected = None   # last selected frame (int16)
+    prev = None
+    times_out = []
+    seen = False
+    for times, frames in stream_gray_chunks(video_path, GATE_FPS, GATE_MAX_SIDE):
+        seen = True
+        seq = frames if prev is None else np.concatenate([prev[None], frames])
+        mad = np.abs(np.diff(seq.astype(np.int16), axis=0)).mean(axis=(1, 2))
+        offset = len(frames) - len(mad)
+        candidates = np.flatnonzero(mad < STABLE_MAD) + offset
+        # Compare all remaining static frames with the current selection at once;
+        # the first that differs enough becomes the new selection.
+        while candidates.size:
+            if selected is None:
+                pick = 0
+            else:
+                changed = np.abs(frames[candidates].astype(np.int16) - selected) > CHANGED_PIXEL_DELTA
+                hits = np.flatnonzero(changed.mean(axis=(1, 2)) > NEW_SLIDE_FRACTION)
+                if not hits.size:
+                    break
+                pick = int(hits[0])
+            i = candidates[pick]
+            selected = frames[i].astype(np.int16)
+            times_out.append(round(float(times[i]), 2))
+            candidates = candidates[pick + 1:]
+        prev = frames[-1].copy()
+    return times_out if seen else None
+
+
+def ocr_slides(video_path: Path, slide_times: list[float], reader) -> list[dict]:
+    """OCR the full-resolution frame at each time; consecutive duplicates are dropped."""
+    cap = cv2.VideoCapture(str(video_path))
+    slides = []
+    last = None
+    try:
+        for t in slide_times:
+            cap.set(cv2.CAP_PROP_POS_MSEC, t * 1000.0)
+            ok, frame = cap.read()
+            if not ok or frame is None:
+                continue
+            lines = [text.strip() for _, text, conf in reader.readtext(frame) if conf >= MIN_CONFIDENCE and text.strip()]
+            text = " ".join(lines)
+            if text and text != last:
+                slides.append({"t": t, "text": text})
+                last = text
+    finally:
+        cap.release()
+    return slides
+
+
+def tokenize(text: str) -> set[str]:
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = set()
+    for run in CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.update(w for w in WORD.findall(text) if len(w) >= 2 or w.isdigit())
+    return tokens
+
+
+def _cache_path(digest: str) -> Path:
+    return CACHE_DIR / f"{digest}.json"
+
+
+def load_cached(digest: str) -> Optional[list[dict]]:
+    try:
+        with open(_cache_path(digest), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data["slides"] if data.get("version") == CACHE_VERSION else None
+
+
+def save_cached(digest: str, source: str, slides: list[dict]) -> None:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _cache_path(digest).with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "source": source, "slides": slides}, f, ensure_ascii=False)
+    os.replace(tmp, _cache_path(digest))
+
+
+def _make_reader():
+    try:
+        import easyocr
+    except ImportError as e:
+        print("Install dependencies: pip install -r requirements.txt", file=sys.stderr)
+        raise SystemExit(1) from e
+    return easyocr.Reader(["ch_sim", "en"], gpu=False)
+
+
+def build_index(docs: list[dict], doc_slides: list[list[dict]]) -> dict:
+    """token -> [[doc, [seconds, ...]], ...]"""
+    postings = {}
+    for doc, slides in enumerate(doc_slides):
+        for slide in slides:
+            second = int(slide["t"])
+            for token in tokenize(slide["text"]):
+                postings.setdefault(token, {}).setdefault(doc, set()).add(second)
+    return {token: [[doc, sorted(secs)] for doc, secs in sorted(by_doc.items())]
+            for token, by_doc in postings.items()}
+
+
+def write_index(docs: list[dict], postings: dict) -> list[int]:
+    """Write index.json and the gzip shards (only files whose bytes changed); return shard sizes."""
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    shards = [{} for _ in range(SHARDS)]
+    for token in sorted(postings):
+        shards[ord(token[0]) % SHARDS][token] = postings[token]
+    files, sizes = [], []
+    for n, shard in enumerate(shards):
+        name = f"shard_{n:02d}.json.gz"
+        data = gzip.compress(json.dumps(shard, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), mtime=0)
+        _write_if_changed(INDEX_DIR / name, data)
+        files.append(name)
+        sizes.append(len(data))
+    manifest = {"version": 1, "shards": SHARDS, "files": files, "docs": docs}
+    _write_if_changed(INDEX_DIR / "index.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    return sizes
+
+
+def _write_if_changed(path: Path, data: bytes) -> None:
+    try:
+        if path.read_bytes() == data:
+            return
+    except OSError:
+        pass
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="OCR lesson slides and build a sharded search index.")
+    ap.add_argument("--force", action="store_true", help="Re-OCR videos even if cached.")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                    help="Videos scanned for slides in parallel (OCR itself runs one at a time).")
+    args = ap.parse_args()
+
+    cache = default_cache()
+    docs, videos = [], []
+    for section in SECTIONS:
+        db_path = ROOT / section / "db.json"
+        if not db_path.is_file():
+            continue
+        with open(db_path, "r", encoding="utf-8") as f:
+            db = json.load(f)
+        for item in db.get("list", []):
+            name = item.get("filename", "")
+            if Path(name).suffix.lower() not in VIDEO_EXTENSIONS:
+                continue
+            video = resolve_video(ROOT / section, name)
+            if video is None:
+                continue
+            docs.append({"section": section, "filename": name})
+            videos.append(video)
+
+    digests = [cache.video_hash(v) for v in videos]
+    doc_slides = [None if args.force else load_cached(d) for d in digests]
+    todo = sorted({d: v for d, v, s in zip(digests, videos, doc_slides) if s is None}.items())
+    print(f"{len(docs)} lesson(s), {len(set(digests))} distinct video(s), {len(todo)} to OCR")
+
+    if todo:
+        reader = _make_reader()
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            # Slide gating for the next videos runs while the current one is OCR'd
+            for (digest, video), slide_times in zip(todo, pool.map(lambda job: select_slide_times(job[1]), todo)):
+                if slide_times is None:
+                    print(f"- {video.name}: could not decode")
+                    continue
+                slides = ocr_slides(video, slide_times, reader)
+                save_cached(digest, video.name, slides)
+                print(f"- {video.name}: {len(slide_times)} slide frame(s), {len(slides)} with text")
+        doc_slides = [load_cached(d) or [] for d in digests]
+
+    postings = build_index(docs, doc_slides)
+    sizes = write_index(docs, postings)
+    print(f"Wrote {len(postings)} token(s) in {SHARDS} shard(s), {sum(sizes) / 1024:.1f}KB total "
+          f"(largest {max(sizes) / 1024:.1f}KB) to {INDEX_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,11 @@ from pathlib import Path
 import re
 import sys
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # shared frame_cache.py
+
 try:
-    import cv2
     import easyocr
+    from frame_cache import default_cache
 except ImportError as e:
     print("Install dependencies: pip install -r requirements.txt", file=sys.stderr)
     raise SystemExit(1) from e
@@ -27,13 +29,8 @@ def sanitize_filename(title: str) -> str:
 
 
 def extract_first_frame(video_path: Path):
-    """Read first frame from video; return numpy array or None."""
-    cap = cv2.VideoCapture(str(video_path))
-    if not cap.isOpened():
-        return None
-    ok, frame = cap.read()
-    cap.release()
-    return frame if ok else None
+    """Read first frame from video (via the shared frame cache); return numpy array or None."""
+    return default_cache().first_frame(video_path)
 
 
 def parse_title_from_frame(frame, reader) -> str:
@@ -11,13 +11,28 @@ For each video:
 Backup:
 - Create a sibling folder videos_backup_<timestamp> and copy all original
   videos there before modifying anything.
+
+With --chunked, each video is split at keyframes and encoded in parallel
+chunks that are joined losslessly (see ../chunked_encode.py); worthwhile for
+long lessons on multi-core machines.
+
+Every trim is recorded in a write-ahead job journal (../job_journal.py):
+files whose content is already a recorded trim output are never trimmed
+again, and --resume continues an interrupted run from its saved plan
+(start times and backup folder) without a new backup or re-analysis.
 """
 
+import argparse
 import shutil
 import subprocess
+import sys
 from datetime import datetime
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # shared chunked_encode.py, job_journal.py
+
+from job_journal import JobJournal, job_key
+
 from analyze_title_screens import analyze_title_screen, VIDEO_DIR
 
 
@@ -49,11 +64,26 @@ def backup_videos(videos_dir: Path) -> Path:
     return backup_dir
 
 
-def trim_video(input_path: Path, output_path: Path, start_time: float) -> None:
+def trim_video(input_path: Path, output_path: Path, start_time: float, chunked: bool = False) -> None:
     """
     Use ffmpeg to trim the first start_time seconds.
     We re-encode video+audio to be safe (copy sometimes fails with non-keyframe cuts).
+    With chunked, the video is encoded in parallel keyframe-split chunks.
     """
+    if chunked:
+        from chunked_encode import encode_chunked, probe_duration
+
+        duration = probe_duration(str(input_path))
+        if duration is None:
+            raise RuntimeError(f"could not get duration of {input_path.name}")
+        print(f"    ffmpeg trimming from {start_time:.3f}s in parallel chunks ...")
+        result = encode_chunked(str(input_path), str(output_path), ["-c:v", "libx264"], ["-c:a", "aac"],
+                                start=start_time, duration=duration)
+        if result is None:
+            raise RuntimeError(f"ffmpeg failed for {input_path.name}")
+        print(f"    {result['chunks']} chunk(s) in {result['seconds']:.1f}s")
+        return
+
     # ffmpeg command:
     # ffmpeg -y -ss <start_time> -i input -c:v libx264 -c:a aac -movflags +faststart output
     cmd = [
@@ -79,6 +109,11 @@ def trim_video(input_path: Path, output_path: Path, start_time: float) -> None:
 
 
 def main() -> None:
+    ap = argparse.ArgumentParser(description="Back up lsLearns/videos and trim static title screens.")
+    ap.add_argument("--chunked", action="store_true", help="Encode keyframe-split chunks in parallel.")
+    ap.add_argument("--resume", action="store_true", help="Continue the unfinished jobs of an interrupted run.")
+    args = ap.parse_args()
+
     videos_dir = VIDEO_DIR
     if not videos_dir.is_dir():
         print(f"Video directory not found: {videos_dir}")
@@ -86,38 +121,54 @@ def main() -> None:
 
     ensure_ffmpeg()
 
-    files = sorted(
-        f for f in videos_dir.iterdir()
-        if f.is_file() and f.suffix.lower() in {".mp4", ".m4v"}
-    )
-    if not files:
-        print("No .mp4/.m4v files found in lsLearns/videos/")
-        return
-
-    # Backup originals first
-    backup_dir = backup_videos(videos_dir)
-    print(f"Backup complete: {backup_dir}")
+    journal = JobJournal("trim_title_screens")
+    pending = journal.unfinished() if args.resume else []
+    if pending:
+        backup_dir = journal.resume_run().get("backupDir")
+        print(f"Resuming {len(pending)} unfinished trim(s) from the interrupted run")
+        jobs = [(rec["key"], Path(rec["input"]), rec["params"]["startTime"]) for rec in pending]
+    else:
+        if args.resume:
+            print("No interrupted run to resume; starting a new one.")
+        files = sorted(
+            f for f in videos_dir.iterdir()
+            if f.is_file() and f.suffix.lower() in {".mp4", ".m4v"} and ".part." not in f.name
+        )
+        if not files:
+            print("No .mp4/.m4v files found in lsLearns/videos/")
+            return
+
+        # Backup originals first
+        backup_dir = backup_videos(videos_dir)
+        print(f"Backup complete: {backup_dir}")
+        journal.start_run(backupDir=str(backup_dir))
+
+        # Plan every trim before touching any file
+        print("\nAnalyzing title screens...")
+        jobs = []
+        for f in files:
+            key = job_key(f)   # relative to the repo root: same-named files in other folders are other jobs
+            if journal.up_to_date(key, f):
+                print(f"- {f.name}: already trimmed (job journal), skipping")
+                continue
+            fps, static_frames = analyze_title_screen(f)
+            if static_frames <= 0 or fps <= 0:
+                print(f"- {f.name}: skipping (could not determine static title length)")
+                continue
+            start_time = static_frames / fps
+            print(f"- {f.name}: static {static_frames} frame(s), fps ~ {fps:.2f}, cut start at {start_time:.3f}s")
+            journal.plan(key, f, {"startTime": round(start_time, 3)})
+            jobs.append((key, f, start_time))
 
     print("\nTrimming title screens from videos...")
-    for f in files:
-        fps, static_frames = analyze_title_screen(f)
-        if static_frames <= 0 or fps <= 0:
-            print(f"- {f.name}: skipping (could not determine static title length)")
-            continue
-        start_time = static_frames / fps
-        print(f"- {f.name}: static {static_frames} frame(s), fps ~ {fps:.2f}, cut start at {start_time:.3f}s")
-
-        tmp_output = f.with_suffix(".trimmed.tmp" + f.suffix)
+    for key, f, start_time in jobs:
+        print(f"- {f.name}")
         try:
-            trim_video(f, tmp_output, start_time)
-            # Replace original atomically
-            f.unlink()
-            tmp_output.rename(f)
+            # Trimmed to a .part file, hashed into the journal, then replaced atomically
+            journal.run(key, f, f, lambda tmp: trim_video(f, Path(tmp), start_time, chunked=args.chunked) or True)
             print(f"    Replaced original with trimmed version.")
         except Exception as e:
             print(f"    Error trimming {f.name}: {e}")
-            if tmp_output.exists():
-                tmp_output.unlink()
 
     print("\nDone. Original videos are backed up in:")
     print(f"  {backup_dir}")
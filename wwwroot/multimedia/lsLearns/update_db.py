@@ -4,11 +4,26 @@ Update db.json with all MP4 files: filename, title (= filename stem), duration.
 """
 import json
 import subprocess
+import sys
 from pathlib import Path
 from typing import Optional
 
-def get_duration_seconds(video_path: Path) -> Optional[float]:
-    """Return duration in seconds or None if unreadable. Tries OpenCV, mutagen, then ffprobe."""
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # shared media_meta.py
+
+def get_duration_seconds(video_path: Path, ask_service: bool = True) -> Optional[float]:
+    """
+    Return duration in seconds or None if unreadable. Tries the metadata service, OpenCV, mutagen, then ffprobe.
+    ask_service=False skips the service, for callers that already asked it about this file.
+    """
+    # 0. Ask the media metadata service (../media_meta.py serve) if it is running
+    if ask_service:
+        try:
+            from media_meta import query_durations
+            duration = query_durations([video_path]).get(str(video_path))
+            if duration is not None:
+                return duration
+        except Exception:
+            pass
     # 1. Try OpenCV (already in requirements for rename script)
     try:
         import cv2
@@ -58,11 +73,20 @@ def main():
     root = Path(__file__).resolve().parent
     mp4s = sorted(p for p in root.iterdir() if p.is_file() and p.suffix.upper() == ".MP4")
 
+    # One batch query to the metadata service; files it does not know are probed one by one
+    try:
+        from media_meta import query_durations
+        known = query_durations(mp4s)
+    except Exception:
+        known = {}
+
     list_ = []
     for p in mp4s:
         filename = p.name
         title = p.stem  # filename without extension
-        duration_sec = get_duration_seconds(p)
+        duration_sec = known.get(str(p))
+        if duration_sec is None:
+            duration_sec = get_duration_seconds(p, ask_service=False)
         entry = {
             "filename": filename,
             "title": title,
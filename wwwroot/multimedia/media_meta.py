@@ -0,0 +1,644 @@
+#!/usr/bin/env python3
+"""
+Media metadata service: a long-running process that keeps duration, dimensions
+and SHA-256 of every video and image under wwwroot/multimedia warm in memory
+and answers batch queries over a Unix socket in milliseconds, so the refresh
+handlers in Program.cs and the db.json scripts do not start ffprobe per file.
+
+The index is persisted to $MEDIA_META_INDEX (default .cache/media_meta.json at
+the repo root) and kept current incrementally: an entry is re-read only when
+the file's size or mtime changed, checked on every query and by a rescan every
+RESCAN_SECONDS. Durations and dimensions come from the MP4 moov box and the
+PNG/JPEG headers (PIL, then ffprobe, for anything else); hashes are computed in
+the background and can be waited for per query.
+
+Protocol: one JSON object per line on $MEDIA_META_SOCKET (default
+.cache/media_meta.sock at the repo root), answered by one line:
+  {"id": 1, "op": "get", "paths": [...], "hash": false}
+  -> {"id": 1, "ok": true, "result": {path: {"duration", "width", "height", "size", "sha256"} | null}}
+  ops: ping, get (paths, hash), list (dir, hash), rescan, stats
+Paths are absolute or relative to wwwroot/multimedia; results are keyed by the
+path as sent. Errors: {"id": 1, "ok": false, "error": "..."}.
+
+Usage:
+  python3 media_meta.py serve                     # run the service
+  python3 media_meta.py query lsLearns/cn/videos/a.mp4 --hash
+  python3 media_meta.py list music/videos
+  python3 media_meta.py selfcheck                 # exercise every op against a temporary tree
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))  # shared mp4_boxes.py
+from mp4_boxes import find_box, find_path, iter_boxes
+
+MEDIA_ROOT = Path(__file__).resolve().parent
+CACHE_ROOT = MEDIA_ROOT.parents[1] / ".cache"
+DEFAULT_SOCKET = Path(os.environ.get("MEDIA_META_SOCKET") or CACHE_ROOT / "media_meta.sock")
+DEFAULT_INDEX = Path(os.environ.get("MEDIA_META_INDEX") or CACHE_ROOT / "media_meta.json")
+INDEX_VERSION = 1
+RESCAN_SECONDS = 30
+HASH_WORKERS = 2
+HASH_CHUNK = 1024 * 1024
+MAX_LINE = 16 * 1024 * 1024   # a batch of a few thousand paths
+VIDEO_EXTENSIONS = {".mp4", ".m4v", ".mov"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".heic", ".heif"}
+
+
+class MetaError(Exception):
+    pass
+
+
+# ---- probing -------------------------------------------------------------
+
+def mp4_info(path) -> Optional[dict]:
+    """Duration (mvhd) and display size of the first video track (tkhd), or None."""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            moov = find_box(f, 0, size, b"moov")
+            mvhd = moov and find_box(f, *moov, b"mvhd")
+            if not mvhd:
+                return None
+            f.seek(mvhd[0])
+            version = f.read(4)[0]
+            if version == 1:
+                timescale, duration = struct.unpack(">IQ", f.read(28)[16:])
+            else:
+                timescale, duration = struct.unpack(">II", f.read(16)[8:])
+            info = {"duration": round(duration / timescale, 3) if timescale and duration else None}
+            for t, payload, box_end in iter_boxes(f, *moov):
+                if t != b"trak":
+                    continue
+                hdlr = find_path(f, payload, box_end, b"mdia", b"hdlr")
+                tkhd = find_box(f, payload, box_end, b"tkhd")
+                if not hdlr or not tkhd:
+                    continue
+                f.seek(hdlr[0] + 8)
+                if f.read(4) != b"vide":
+                    continue
+                f.seek(tkhd[0])
+                f.seek(tkhd[0] + (52 if f.read(1)[0] == 1 else 40))
+                matrix = struct.unpack(">9i", f.read(36))
+                width, height = (v >> 16 for v in struct.unpack(">II", f.read(8)))
+                if matrix[0] == 0 and abs(matrix[1]) == 0x10000:   # rotated 90/270 degrees
+                    width, height = height, width
+                info.update(width=width, height=height)
+                break
+            return info
+    except (OSError, ValueError, struct.error, IndexError, TypeError):
+        return None
+
+
+def image_size(path) -> Optional[tuple]:
+    """(width, height) from the PNG/JPEG header, else PIL; None if unreadable."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(26)
+            if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:2] == b"\xff\xd8":
+                f.seek(2)
+                while True:
+                    marker = f.read(2)
+                    if len(marker) < 2 or marker[0] != 0xFF:
+                        break
+                    (length,) = struct.unpack(">H", f.read(2))
+                    if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                        height, width = struct.unpack(">xHH", f.read(5))
+                        return width, height
+                    f.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+    try:
+        from PIL import Image
+        try:
+            from pillow_heif import register_heif_opener
+            register_heif_opener()
+        except ImportError:
+            pass
+        with Image.open(path) as im:
+            return im.size
+    except Exception:
+        return None
+
+
+def ffprobe_info(path) -> Optional[dict]:
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
+             "stream=width,height:format=duration", "-of", "json", str(path)],
+            capture_output=True, text=True, timeout=30)
+        if out.returncode != 0:
+            return None
+        data = json.loads(out.stdout)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+    stream = (data.get("streams") or [{}])[0]
+    duration = data.get("format", {}).get("duration")
+    return {"duration": round(float(duration), 3) if duration else None,
+            "width": stream.get("width"), "height": stream.get("height")}
+
+
+def probe(path) -> dict:
+    """Duration (videos), width and height; missing values are None."""
+    ext = Path(path).suffix.lower()
+    info = {"duration": None, "width": None, "height": None}
+    if ext in VIDEO_EXTENSIONS:
+        found = mp4_info(path)
+        if not found or found.get("duration") is None or found.get("width") is None:
+            found = {**(found or {}), **{k: v for k, v in (ffprobe_info(path) or {}).items() if v is not None}}
+        info.update(found)
+    else:
+        size = image_size(path)
+        if size:
+            info["width"], info["height"] = size
+    return info
+
+
+def sha256_file(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ---- service -------------------------------------------------------------
+
+class MetaService:
+    def __init__(self, root=MEDIA_ROOT, socket_path=DEFAULT_SOCKET, index_path=DEFAULT_INDEX):
+        self.root = Path(root).resolve()
+        self.socket_path = Path(socket_path)
+        self.index_path = Path(index_path) if index_path else None
+        self.entries = {}    # path relative to root -> {"size", "mtimeNs", "duration", "width", "height", "sha256"}
+        self.requests = 0
+        self._hash_queue = None
+        self._hash_waiters = {}   # rel -> asyncio.Future resolved when the hash is known
+        self._dirty = False
+        self._stopping = None
+        self._loop = None
+        self._writers = set()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.index_path:
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION and data.get("root") == str(self.root):
+            self.entries = data.get("entries", {})
+
+    def save(self) -> None:
+        if not self.index_path or not self._dirty:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "root": str(self.root), "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+        self._dirty = False
+
+    def _rel(self, path: str) -> Optional[str]:
+        p = Path(path)
+        p = (p if p.is_absolute() else self.root / p).resolve()
+        try:
+            return p.relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def _is_media(self, name: str) -> bool:
+        return (not name.startswith(".") and ".part." not in name
+                and Path(name).suffix.lower() in VIDEO_EXTENSIONS | IMAGE_EXTENSIONS)
+
+    async def refresh(self, rel: str) -> Optional[dict]:
+        """Bring one entry up to date with the file on disk; None if it is missing."""
+        try:
+            st = os.stat(self.root / rel)
+        except OSError:
+            if self.entries.pop(rel, None) is not None:
+                self._dirty = True
+            return None
+        entry = self.entries.get(rel)
+        if entry and entry["size"] == st.st_size and entry["mtimeNs"] == st.st_mtime_ns:
+            if entry.get("sha256") is None:
+                self._queue_hash(rel)
+            return entry
+        entry = {"size": st.st_size, "mtimeNs": st.st_mtime_ns,
+                 **await asyncio.to_thread(probe, self.root / rel), "sha256": None}
+        self.entries[rel] = entry
+        self._dirty = True
+        self._queue_hash(rel)
+        return entry
+
+    def _queue_hash(self, rel: str) -> None:
+        if rel not in self._hash_waiters:
+            self._hash_waiters[rel] = asyncio.get_running_loop().create_future()
+            self._hash_queue.put_nowait(rel)
+
+    async def _hash_worker(self) -> None:
+        while True:
+            rel = await self._hash_queue.get()
+            entry = self.entries.get(rel)
+            try:
+                if entry is not None:
+                    digest = await asyncio.to_thread(sha256_file, self.root / rel)
+                    # The file may have changed while it was being hashed
+                    if self.entries.get(rel) is entry:
+                        entry["sha256"] = digest
+                        self._dirty = True
+            except OSError:
+                pass
+            finally:
+                waiter = self._hash_waiters.pop(rel, None)
+                if waiter and not waiter.done():
+                    waiter.set_result(None)
+
+    async def scan(self) -> dict:
+        """Walk the root; pick up new and changed files and forget deleted ones."""
+        def walk():
+            found = []
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                base = Path(dirpath).relative_to(self.root)
+                found.extend((base / n).as_posix() for n in filenames if self._is_media(n))
+            return found
+        found = await asyncio.to_thread(walk)
+        before = set(self.entries)
+        for rel in found:
+            await self.refresh(rel)
+        removed = before - set(found)
+        for rel in removed:
+            self.entries.pop(rel, None)
+        self._dirty |= bool(removed)
+        self.save()
+        return {"files": len(found), "added": len(set(found) - before), "removed": len(removed)}
+
+    async def _rescan_loop(self) -> None:
+        while True:
+            await asyncio.sleep(RESCAN_SECONDS)
+            await self.scan()
+
+    def _public(self, entry: dict) -> dict:
+        return {k: entry.get(k) for k in ("duration", "width", "height", "size", "sha256")}
+
+    async def get(self, paths: list, wait_hash: bool = False) -> dict:
+        rels = [self._rel(p) for p in paths]
+        entries = [await self.refresh(rel) if rel else None for rel in rels]
+        if wait_hash:
+            waiters = [self._hash_waiters[rel] for rel, e in zip(rels, entries)
+                       if e is not None and e.get("sha256") is None and rel in self._hash_waiters]
+            if waiters:
+                await asyncio.gather(*waiters)
+        self.save()
+        return {p: self._public(e) if e is not None else None for p, e in zip(paths, entries)}
+
+    async def list_dir(self, directory: str, wait_hash: bool = False) -> dict:
+        rel_dir = self._rel(directory)
+        if rel_dir is None:
+            raise MetaError(f"outside the media root: {directory}")
+        target = self.root / rel_dir
+        if not target.is_dir():
+            raise MetaError(f"not a directory: {directory}")
+        names = sorted(n for n in os.listdir(target) if self._is_media(n) and (target / n).is_file())
+        found = await self.get([(target / n).as_posix() for n in names], wait_hash)
+        return {n: found[(target / n).as_posix()] for n in names}
+
+    async def handle(self, request: dict):
+        op = request.get("op")
+        if op == "ping":
+            return {"pid": os.getpid(), "root": str(self.root), "files": len(self.entries)}
+        if op == "get":
+            paths = request.get("paths")
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                raise MetaError("get needs a list of paths")
+            return await self.get(paths, bool(request.get("hash")))
+        if op == "list":
+            return await self.list_dir(str(request.get("dir", "")), bool(request.get("hash")))
+        if op == "rescan":
+            return await self.scan()
+        if op == "stats":
+            return {"files": len(self.entries), "pendingHashes": len(self._hash_waiters),
+                    "requests": self.requests, "bytes": sum(e["size"] for e in self.entries.values())}
+        raise MetaError(f"unknown op: {op!r}")
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while line := await reader.readline():
+                self.requests += 1
+                rid = None
+                try:
+                    request = json.loads(line)
+                    rid = request.get("id")
+                    response = {"id": rid, "ok": True, "result": await self.handle(request)}
+                except (ValueError, AttributeError) as e:
+                    response = {"id": rid, "ok": False, "error": f"bad request: {e}"}
+                except MetaError as e:
+                    response = {"id": rid, "ok": False, "error": str(e)}
+                except Exception as e:
+                    # e.g. OSError from a rescan: fail this request, keep the connection
+                    response = {"id": rid, "ok": False, "error": f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def serve(self, ready: Optional[threading.Event] = None, rescan: bool = True) -> None:
+        self._hash_queue = asyncio.Queue()
+        workers = [asyncio.create_task(self._hash_worker()) for _ in range(HASH_WORKERS)]
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()   # stale socket from a previous run
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        server = await asyncio.start_unix_server(self._client, path=str(self.socket_path), limit=MAX_LINE)
+        tasks = []
+        try:
+            if rescan:
+                started = time.perf_counter()
+                result = await self.scan()
+                print(f"Indexed {result['files']} file(s) under {self.root} in {time.perf_counter() - started:.1f}s; "
+                      f"listening on {self.socket_path}", flush=True)
+                tasks.append(asyncio.create_task(self._rescan_loop()))
+            if ready:
+                ready.set()
+            async with server:
+                await self._stopping.wait()
+                for writer in list(self._writers):
+                    writer.close()
+                await asyncio.sleep(0)
+        finally:
+            for task in tasks + workers:
+                task.cancel()
+            await asyncio.gather(*tasks, *workers, return_exceptions=True)
+            self.save()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+    def stop(self) -> None:
+        """Stop serve(); may be called from another thread."""
+        self._loop.call_soon_threadsafe(self._stopping.set)
+
+
+# ---- client --------------------------------------------------------------
+
+class MetaClient:
+    """Blocking client; one connection, reused for every call."""
+
+    def __init__(self, socket_path=None, timeout: float = 5.0):
+        self.socket_path = str(socket_path or DEFAULT_SOCKET)
+        self.timeout = timeout
+        self._sock = None
+        self._buf = b""
+        self._next_id = 0
+
+    def _connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._sock = sock
+        return self._sock
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def call(self, op: str, **params):
+        sock = self._connect()
+        self._next_id += 1
+        sock.sendall(json.dumps({"id": self._next_id, "op": op, **params}).encode("utf-8") + b"\n")
+        while b"\n" not in self._buf:
+            chunk = sock.recv(65536)
+            if not chunk:
+                self.close()
+                raise ConnectionError("media metadata service closed the connection")
+            self._buf += chunk
+        line, self._buf = self._buf.split(b"\n", 1)
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise MetaError(response.get("error", "unknown error"))
+        return response["result"]
+
+    def ping(self) -> dict:
+        return self.call("ping")
+
+    def get(self, paths, hash: bool = False) -> dict:
+        return self.call("get", paths=[str(p) for p in paths], hash=hash)
+
+    def list(self, directory, hash: bool = False) -> dict:
+        return self.call("list", dir=str(directory), hash=hash)
+
+    def rescan(self) -> dict:
+        return self.call("rescan")
+
+    def stats(self) -> dict:
+        return self.call("stats")
+
+
+def query_durations(paths, socket_path=None) -> dict:
+    """{path: seconds} from the service for the paths it knows; {} if it is not running."""
+    resolved = {str(p): str(Path(p).resolve()) for p in paths}
+    client = MetaClient(socket_path, timeout=2.0)
+    try:
+        found = client.get(sorted(set(resolved.values())))
+    except (OSError, ValueError, MetaError):
+        return {}
+    finally:
+        client.close()
+    return {p: found[r]["duration"] for p, r in resolved.items()
+            if found.get(r) and found[r].get("duration") is not None}
+
+
+# ---- self-check ----------------------------------------------------------
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(payload)) + box_type + payload
+
+
+def _sample_mp4(duration_s: int, width: int, height: int, rotate: bool = False) -> bytes:
+    """Minimal MP4 (ftyp + moov with mvhd and one video trak, no media data)."""
+    mvhd = _box(b"mvhd", bytes(4) + struct.pack(">IIII", 0, 0, 1000, duration_s * 1000) + bytes(80))
+    matrix = (0, 0x10000, 0, -0x10000, 0, 0, 0, 0, 0x40000000) if rotate else \
+             (0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+    tkhd = _box(b"tkhd", bytes(4) + bytes(36) + struct.pack(">9i", *matrix) + struct.pack(">II", width << 16, height << 16))
+    hdlr = _box(b"hdlr", bytes(8) + b"vide" + bytes(13))
+    trak = _box(b"trak", tkhd + _box(b"mdia", hdlr))
+    return _box(b"ftyp", b"isom" + bytes(4) + b"isom") + _box(b"moov", mvhd + trak)
+
+
+def _sample_png(width: int, height: int) -> bytes:
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    raw = b"".join(b"\x00" + bytes(width) for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def _sample_jpeg_header(width: int, height: int) -> bytes:
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9)
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + app0 + sof0 + b"\xff\xd9"
+
+
+def selfcheck() -> int:
+    failures = []
+
+    def check(name, cond):
+        print(f"{'ok  ' if cond else 'FAIL'} {name}")
+        if not cond:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "media"
+        (root / "videos").mkdir(parents=True)
+        (root / "images").mkdir()
+        (root / "videos" / "a.mp4").write_bytes(_sample_mp4(90, 1920, 1080))
+        (root / "videos" / "portrait.mp4").write_bytes(_sample_mp4(12, 1920, 1080, rotate=True))
+        (root / "images" / "p.png").write_bytes(_sample_png(40, 30))
+        (root / "images" / "j.jpg").write_bytes(_sample_jpeg_header(640, 480))
+        (root / "images" / ".hidden.png").write_bytes(_sample_png(1, 1))
+        sock_path = Path(tmp) / "meta.sock"
+        index_path = Path(tmp) / "index.json"
+
+        service = MetaService(root, sock_path, index_path)
+        ready = threading.Event()
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=lambda: loop.run_until_complete(service.serve(ready, rescan=False)), daemon=True)
+        thread.start()
+        ready.wait(10)
+        client = MetaClient(sock_path)
+        try:
+            check("ping", client.ping()["root"] == str(root.resolve()))
+            check("rescan finds media, skips hidden files", client.rescan() == {"files": 4, "added": 4, "removed": 0})
+
+            got = client.get(["videos/a.mp4", str(root / "videos" / "portrait.mp4"), "images/p.png",
+                              "images/j.jpg", "videos/missing.mp4", "../outside.mp4"], hash=True)
+            a = got["videos/a.mp4"]
+            check("mp4 duration and size", (a["duration"], a["width"], a["height"]) == (90, 1920, 1080))
+            portrait = got[str(root / "videos" / "portrait.mp4")]
+            check("rotated mp4 reports display size", (portrait["width"], portrait["height"]) == (1080, 1920))
+            check("png header", (got["images/p.png"]["width"], got["images/p.png"]["height"]) == (40, 30))
+            check("jpeg header", (got["images/j.jpg"]["width"], got["images/j.jpg"]["height"]) == (640, 480))
+            check("hash=true waits for sha256",
+                  a["sha256"] == hashlib.sha256((root / "videos" / "a.mp4").read_bytes()).hexdigest())
+            check("missing and outside paths are null", got["videos/missing.mp4"] is None and got["../outside.mp4"] is None)
+
+            listed = client.list("videos")
+            check("list", sorted(listed) == ["a.mp4", "portrait.mp4"] and listed["a.mp4"]["duration"] == 90)
+
+            # Changed file is re-probed on the next query, no rescan needed
+            path = root / "videos" / "a.mp4"
+            path.write_bytes(_sample_mp4(45, 1280, 720))
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+            b = client.get(["videos/a.mp4"], hash=True)["videos/a.mp4"]
+            check("changed file re-probed and re-hashed",
+                  b["duration"] == 45 and b["width"] == 1280 and b["sha256"] != a["sha256"])
+
+            (root / "images" / "j.jpg").unlink()
+            check("rescan forgets deleted files", client.rescan()["removed"] == 1)
+
+            started = time.perf_counter()
+            for _ in range(200):
+                client.get(["videos/a.mp4", "videos/portrait.mp4", "images/p.png"])
+            per_query = (time.perf_counter() - started) / 200 * 1000
+            check(f"warm batch query {per_query:.2f}ms", per_query < 50)
+
+            try:
+                client.call("frobnicate")
+                check("unknown op is an error", False)
+            except MetaError:
+                check("unknown op is an error", True)
+            try:
+                client.list("../..")
+                check("list outside the root is an error", False)
+            except MetaError:
+                check("list outside the root is an error", True)
+            check("stats", client.stats()["files"] == 3)
+
+            durations = query_durations([root / "videos" / "portrait.mp4"], sock_path)
+            check("query_durations", list(durations.values()) == [12])
+            check("query_durations without a service is empty",
+                  query_durations([root / "videos" / "a.mp4"], Path(tmp) / "nothing.sock") == {})
+        finally:
+            client.close()
+            service.stop()
+            thread.join(10)
+            loop.close()
+
+        reloaded = MetaService(root, sock_path, index_path)
+        check("index persisted", reloaded.entries.get("videos/a.mp4", {}).get("duration") == 45)
+
+    print(f"{'FAILED' if failures else 'All checks passed'} ({len(failures)} failure(s))")
+    return 1 if failures else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Media metadata service (duration, dimensions, SHA-256) on a Unix socket.")
+    ap.add_argument("--socket", default=str(DEFAULT_SOCKET), help=f"Socket path (default {DEFAULT_SOCKET}).")
+    sub = ap.add_subparsers(dest="command", required=True)
+    serve_p = sub.add_parser("serve", help="Run the service.")
+    serve_p.add_argument("--root", default=str(MEDIA_ROOT), help="Folder to index (default wwwroot/multimedia).")
+    serve_p.add_argument("--index", default=str(DEFAULT_INDEX), help="Persisted index file.")
+    query_p = sub.add_parser("query", help="Print metadata for files.")
+    query_p.add_argument("paths", nargs="+")
+    query_p.add_argument("--hash", action="store_true", help="Wait for SHA-256 hashes.")
+    list_p = sub.add_parser("list", help="Print metadata for the media files in a folder.")
+    list_p.add_argument("dir")
+    list_p.add_argument("--hash", action="store_true", help="Wait for SHA-256 hashes.")
+    sub.add_parser("stats", help="Print service statistics.")
+    sub.add_parser("selfcheck", help="Run the service against a temporary tree and check every op.")
+    args = ap.parse_args()
+
+    if args.command == "selfcheck":
+        raise SystemExit(selfcheck())
+    if args.command == "serve":
+        try:
+            asyncio.run(MetaService(args.root, args.socket, args.index).serve())
+        except KeyboardInterrupt:
+            pass
+        return
+    client = MetaClient(args.socket)
+    try:
+        if args.command == "query":
+            result = client.get(args.paths, args.hash)
+        elif args.command == "list":
+            result = client.list(args.dir, args.hash)
+        else:
+            result = client.stats()
+    except OSError as e:
+        print(f"Cannot reach the media metadata service at {args.socket}: {e}", file=sys.stderr)
+        raise SystemExit(1)
+    except MetaError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        raise SystemExit(1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
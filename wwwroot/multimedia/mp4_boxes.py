@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+ISO-BMFF (MP4/M4V/MOV/HEIC) box reader shared by check_resources.py,
+chunked_encode.py and media_meta.py. Boxes are walked with seeks and 8/16-byte
+header reads only, so large files are indexed without reading media data.
+"""
+import struct
+
+
+def iter_boxes(f, start: int, end: int):
+    """
+    Yield (box_type, payload_start, box_end) for the boxes in [start, end).
+    Raises ValueError if a box header is malformed or a box runs past `end`.
+    """
+    pos = start
+    while pos < end:
+        f.seek(pos)
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            raise ValueError(f"truncated box header at offset {pos}")
+        box_size, box_type = struct.unpack(">I4s", hdr)
+        header_len = 8
+        if box_size == 1:
+            ext = f.read(8)
+            if len(ext) < 8:
+                raise ValueError(f"truncated box header at offset {pos}")
+            box_size = struct.unpack(">Q", ext)[0]
+            header_len = 16
+        elif box_size == 0:
+            box_size = end - pos  # box extends to end of file
+        if box_size < header_len:
+            raise ValueError(f"invalid size {box_size} for box {box_type!r} at offset {pos}")
+        if pos + box_size > end:
+            raise ValueError(
+                f"box {box_type.decode('latin-1')!r} at offset {pos} needs {pos + box_size} bytes, "
+                f"file has {end} (truncated?)"
+            )
+        yield box_type, pos + header_len, pos + box_size
+        pos += box_size
+
+
+def find_box(f, start: int, end: int, box_type: bytes):
+    """(payload_start, box_end) of the first box_type in [start, end), or None."""
+    for t, payload, box_end in iter_boxes(f, start, end):
+        if t == box_type:
+            return payload, box_end
+    return None
+
+
+def find_path(f, start: int, end: int, *types: bytes):
+    """find_box() down a path of nested boxes, e.g. (b"mdia", b"minf", b"stbl")."""
+    for t in types:
+        found = find_box(f, start, end, t)
+        if found is None:
+            return None
+        start, end = found
+    return start, end
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Find leading/trailing silence and integrated loudness of each music video,
+and store the results in db.json so compress_video.py can trim and
+loudness-normalise in the same encode pass.
+
+Audio is decoded by ffmpeg to 48 kHz stereo float32 PCM (mono sources stay
+mono, so BS.1770 counts their one channel once instead of as dual-mono, which
+would read +3 dB loud) and streamed through a pipe in fixed-size chunks, so
+memory stays constant regardless of clip length:
+- Each chunk is split into 100 ms sub-blocks; RMS/peak per sub-block is computed
+  with NumPy (no per-sample Python loops).
+- Silence = sub-blocks whose RMS is below SILENCE_THRESHOLD_DB. Only the first
+  and last loud sub-block indices are kept.
+- Integrated loudness follows ITU-R BS.1770 (400 ms blocks, 75% overlap,
+  -70 LUFS absolute gate, -10 LU relative gate). Block energies go into a fixed
+  histogram instead of a list. K-weighting uses scipy.signal.lfilter when scipy
+  is installed; without it the loudness is unweighted, reported as such and not
+  stored in db.json (loudnessLUFS is set to null, so no gain is applied).
+
+Requires ffmpeg (and ffprobe, for the channel count) and numpy.
+
+Usage:
+  python3 analyze_audio.py [video ...]          # default: all files in videos/
+  python3 analyze_audio.py --dry-run            # print results, do not touch db.json
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+SAMPLE_RATE = 48000
+CHANNELS = 2                   # decode layout, except for mono sources
+SUB_BLOCK_SECONDS = 0.1        # 100 ms: silence resolution and BS.1770 block step
+CHUNK_SUB_BLOCKS = 20          # 2 s of audio per pipe read
+SILENCE_THRESHOLD_DB = -50.0   # RMS (dBFS) below this counts as silence
+
+# BS.1770 gating
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+HIST_MIN_LUFS = -70.0
+HIST_MAX_LUFS = 10.0
+HIST_STEP_LU = 0.05
+
+# K-weighting filter coefficients for 48 kHz (ITU-R BS.1770-4, table 1 and 2)
+K_SHELF_B = [1.53512485958697, -2.69169618940638, 1.19839281085285]
+K_SHELF_A = [1.0, -1.69065929318241, 0.73248077421585]
+K_HIGHPASS_B = [1.0, -2.0, 1.0]
+K_HIGHPASS_A = [1.0, -1.99004745483398, 0.99007225036621]
+
+VIDEO_EXTENSIONS = (".mp4", ".m4v")
+
+
+def _db(x: float) -> float:
+    return 10.0 * math.log10(x) if x > 0 else float("-inf")
+
+
+class _KWeighting:
+    """Stateful K-weighting across chunks (needs scipy; None if unavailable)."""
+
+    def __init__(self, channels: int):
+        from scipy.signal import lfilter  # ImportError handled by _make_k_weighting
+        self._lfilter = lfilter
+        self._zi_shelf = np.zeros((2, channels))
+        self._zi_hp = np.zeros((2, channels))
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        y, self._zi_shelf = self._lfilter(K_SHELF_B, K_SHELF_A, x, axis=0, zi=self._zi_shelf)
+        y, self._zi_hp = self._lfilter(K_HIGHPASS_B, K_HIGHPASS_A, y, axis=0, zi=self._zi_hp)
+        return y
+
+
+def _make_k_weighting(channels: int):
+    try:
+        return _KWeighting(channels)
+    except ImportError:
+        return None
+
+
+def _decode_channels(video_path: str) -> int:
+    """1 for a mono audio track, otherwise CHANNELS (also when ffprobe is unavailable)."""
+    try:
+        r = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries", "stream=channels",
+             "-of", "default=noprint_wrappers=1:nokey=1", video_path],
+            capture_output=True, text=True, timeout=30,
+        )
+        return 1 if r.returncode == 0 and r.stdout.strip() == "1" else CHANNELS
+    except (FileNotFoundError, subprocess.TimeoutExpired, OSError):
+        return CHANNELS
+
+
+def _read_exact(stream, view: memoryview) -> int:
+    """Fill view from stream (pipes return short reads); return bytes read."""
+    total = 0
+    while total < len(view):
+        n = stream.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+def analyze_audio(video_path: str) -> Optional[dict]:
+    """
+    Stream the audio track of video_path through ffmpeg and analyse it.
+    Returns dict (durationInSeconds, leadingSilence, trailingSilence, loudnessLUFS,
+    peakDBFS, kWeighted) or None if the file has no decodable audio.
+    """
+    channels = _decode_channels(video_path)
+    cmd = [
+        "ffmpeg", "-v", "error", "-nostdin", "-i", video_path,
+        "-vn", "-ac", str(channels), "-ar", str(SAMPLE_RATE), "-f", "f32le", "-",
+    ]
+    # stderr goes to a file: a pipe nobody reads while stdout is drained could fill up and block ffmpeg
+    errfile = tempfile.TemporaryFile()
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errfile)
+    except FileNotFoundError:
+        errfile.close()
+        raise RuntimeError("ffmpeg not found. Please install it (e.g., brew install ffmpeg).")
+
+    sub_block = int(SAMPLE_RATE * SUB_BLOCK_SECONDS)
+    frame_bytes = 4 * channels
+    buf = bytearray(CHUNK_SUB_BLOCKS * sub_block * frame_bytes)
+    view = memoryview(buf)
+    k_weight = _make_k_weighting(channels)
+
+    n_bins = int(round((HIST_MAX_LUFS - HIST_MIN_LUFS) / HIST_STEP_LU))
+    hist_energy = np.zeros(n_bins)
+    hist_count = np.zeros(n_bins, dtype=np.int64)
+    carry_ms = np.zeros(0)  # last 3 sub-block energies, for overlapping 400 ms blocks
+    pending = np.zeros((0, channels), dtype=np.float32)  # samples short of a full sub-block
+
+    sub_blocks_seen = 0
+    first_loud = None
+    last_loud = None
+    peak = 0.0
+    total_samples = 0
+
+    try:
+        while True:
+            n = _read_exact(proc.stdout, view)
+            n -= n % frame_bytes
+            if n == 0:
+                break
+            samples = np.frombuffer(buf, dtype="<f4", count=n // 4).reshape(-1, channels)
+            total_samples += len(samples)
+            if len(pending):
+                samples = np.concatenate([pending, samples])
+            n_full = len(samples) // sub_block
+            pending = samples[n_full * sub_block:].copy()
+            if n_full == 0:
+                continue
+            blocks = samples[: n_full * sub_block].reshape(n_full, sub_block, channels)
+
+            # Silence / peak (unweighted, max over channels)
+            abs_max = np.abs(blocks).max(axis=(1, 2))
+            peak = max(peak, float(abs_max.max()))
+            rms = np.sqrt(np.mean(blocks * blocks, axis=1)).max(axis=1)
+            loud = np.flatnonzero(rms > 10 ** (SILENCE_THRESHOLD_DB / 20))
+            if loud.size:
+                if first_loud is None:
+                    first_loud = sub_blocks_seen + int(loud[0])
+                last_loud = sub_blocks_seen + int(loud[-1])
+            sub_blocks_seen += n_full
+
+            # Loudness: mean square per sub-block summed over channels (G=1 for L/R and mono)
+            weighted = k_weight(samples[: n_full * sub_block]).reshape(n_full, sub_block, channels) if k_weight else blocks
+            ms = np.mean(weighted * weighted, axis=1).sum(axis=1)
+            ms = np.concatenate([carry_ms, ms])
+            if len(ms) >= 4:
+                block_energy = np.lib.stride_tricks.sliding_window_view(ms, 4).mean(axis=1)
+                with np.errstate(divide="ignore"):
+                    block_lufs = -0.691 + 10.0 * np.log10(block_energy)
+                keep = block_lufs > ABSOLUTE_GATE_LUFS
+                idx = np.clip(((block_lufs[keep] - HIST_MIN_LUFS) / HIST_STEP_LU).astype(int), 0, n_bins - 1)
+                np.add.at(hist_energy, idx, block_energy[keep])
+                np.add.at(hist_count, idx, 1)
+            carry_ms = ms[-3:]
+        if len(pending):
+            # Partial sub-block at the end of the file: counts for peak and silence only
+            peak = max(peak, float(np.abs(pending).max()))
+            if float(np.sqrt(np.mean(pending * pending, axis=0)).max()) > 10 ** (SILENCE_THRESHOLD_DB / 20):
+                first_loud = sub_blocks_seen if first_loud is None else first_loud
+                last_loud = sub_blocks_seen
+        proc.stdout.close()
+        proc.wait()
+        errfile.seek(0)
+        stderr = errfile.read().decode("utf-8", "replace")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        errfile.close()
+
+    if proc.returncode != 0 or total_samples == 0:
+        if stderr.strip():
+            print(f"  ffmpeg: {stderr.strip().splitlines()[-1]}")
+        return None
+
+    duration = total_samples / SAMPLE_RATE
+    loudness = None
+    if hist_count.sum() > 0:
+        # Relative gate: drop blocks more than 10 LU below the abs-gated mean
+        abs_mean = hist_energy.sum() / hist_count.sum()
+        rel_gate = -0.691 + _db(abs_mean) + RELATIVE_GATE_LU
+        bin_lufs = HIST_MIN_LUFS + (np.arange(n_bins) + 0.5) * HIST_STEP_LU
+        sel = bin_lufs > rel_gate
+        if hist_count[sel].sum() > 0:
+            loudness = -0.691 + _db(hist_energy[sel].sum() / hist_count[sel].sum())
+
+    if first_loud is None:
+        leading = trailing = duration  # all silent
+    else:
+        leading = first_loud * SUB_BLOCK_SECONDS
+        trailing = max(0.0, duration - (last_loud + 1) * SUB_BLOCK_SECONDS)
+    return {
+        "durationInSeconds": round(duration, 3),
+        "leadingSilence": round(leading, 2),
+        "trailingSilence": round(trailing, 2),
+        "loudnessLUFS": round(loudness, 1) if loudness is not None else None,
+        "peakDBFS": round(20 * math.log10(peak), 1) if peak > 0 else None,
+        "kWeighted": k_weight is not None,
+    }
+
+
+def to_db_fields(result: dict) -> dict:
+    """db.json fields for one analysis result (trim points as absolute times)."""
+    start = result["leadingSilence"]
+    end = max(start, result["durationInSeconds"] - result["trailingSilence"])
+    return {
+        "trimStartInSeconds": round(start, 2),
+        "trimEndInSeconds": round(end, 2),
+        # Unweighted loudness is not LUFS; null keeps compress_video.py from normalising with it
+        "loudnessLUFS": result["loudnessLUFS"] if result["kWeighted"] else None,
+        "peakDBFS": result["peakDBFS"],
+    }
+
+
+def update_db(db_path: str, results: dict) -> int:
+    """Merge analysis results (filename -> result) into db.json; return entries updated."""
+    with open(db_path, "r", encoding="utf-8") as f:
+        db = json.load(f)
+    updated = 0
+    for item in db.get("list", []):
+        result = results.get(item.get("filename"))
+        if result is None:
+            continue
+        item.update(to_db_fields(result))
+        updated += 1
+    write_db(db_path, db)
+    return updated
+
+
+def write_db(db_path: str, db: dict) -> None:
+    """Write db.json atomically, so a crash mid-write never truncates it."""
+    fd, tmp = tempfile.mkstemp(prefix=".db.", suffix=".json", dir=os.path.dirname(os.path.abspath(db_path)))
+    try:
+        os.chmod(tmp, os.stat(db_path).st_mode & 0o777)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(db, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, db_path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Analyze leading/trailing silence and loudness of music videos.")
+    ap.add_argument("videos", nargs="*", help="Video files (default: all in videos/)")
+    ap.add_argument("--dry-run", action="store_true", help="Only print results, do not update db.json.")
+    ap.add_argument("--workers", type=int, default=2, help="Files analysed in parallel (default 2).")
+    args = ap.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    video_dir = os.path.join(script_dir, "videos")
+    if args.videos:
+        paths = args.videos
+    elif os.path.isdir(video_dir):
+        paths = [os.path.join(video_dir, f) for f in sorted(os.listdir(video_dir)) if f.lower().endswith(VIDEO_EXTENSIONS)]
+    else:
+        print("No videos/ folder found.")
+        return
+    if not paths:
+        print("No .mp4/.m4v files found.")
+        return
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for path, result in zip(paths, pool.map(analyze_audio, paths)):
+            name = os.path.basename(path)
+            if result is None:
+                print(f"- {name}: no audio / could not decode")
+                continue
+            results[name] = result
+            loud = f"{result['loudnessLUFS']} LUFS" if result["loudnessLUFS"] is not None else "n/a"
+            print(f"- {name}: lead {result['leadingSilence']:.2f}s, trail {result['trailingSilence']:.2f}s, "
+                  f"loudness {loud}{'' if result['kWeighted'] else ' (unweighted, not stored; install scipy)'}, peak {result['peakDBFS']} dBFS")
+
+    if args.dry_run or not results:
+        return
+    db_path = os.path.join(script_dir, "db.json")
+    if not os.path.exists(db_path):
+        print(f"db.json not found: {db_path}")
+        sys.exit(1)
+    n = update_db(db_path, results)
+    print(f"Updated {n} entries in {db_path}")
+
+
+if __name__ == "__main__":
+    main()
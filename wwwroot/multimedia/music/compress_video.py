@@ -1,11 +1,39 @@
 #!/usr/bin/env python3
 """
 Compress video file to target size using ffmpeg or alternative methods.
+
+With --trim-normalize, the trim points and loudness stored in db.json by
+analyze_audio.py are applied in the same encode pass (leading/trailing
+silence cut, static gain to LOUDNESS_TARGET_LUFS capped by PEAK_CEILING_DB).
+
+With --predict, short sample segments are encoded in parallel at several
+CRFs and compared to the source with a NumPy SSIM; the CRF meeting both the
+size budget and --min-ssim is used for the single final encode, and the final
+size error and SSIM are reported. (--predict needs numpy.)
+
+With --chunked, long videos are split at keyframes and the chunks encoded in
+parallel ffmpeg processes with the same settings, then joined losslessly
+(see ../chunked_encode.py). Audio is still encoded in one pass.
+
+Each encode is recorded in a job journal (../job_journal.py) and written via a
+.part file, so an interrupted run never leaves a truncated output. With
+--resume, an output already produced from the same input and settings is kept
+instead of being encoded again (for library-wide loops after a reboot).
 """
+import argparse
+import json
 import os
 import subprocess
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # shared chunked_encode.py, job_journal.py
+
+from job_journal import JobJournal
+
+# Loudness normalisation target and sample-peak ceiling for --trim-normalize
+LOUDNESS_TARGET_LUFS = -14.0
+PEAK_CEILING_DB = -1.0
+
 def get_duration_opencv(input_file):
     """Get video duration using OpenCV fallback."""
     try:
@@ -22,9 +50,36 @@ def get_duration_opencv(input_file):
         pass
     return None
 
-def compress_with_ffmpeg(input_file, output_file, target_size_mb=5):
-    """Compress video using ffmpeg to target size."""
-    duration = None
+def load_audio_settings(input_file):
+    """
+    Return (trim_start, trim_end, gain_db) for input_file from db.json
+    (written by analyze_audio.py), or (None, None, None) if not analysed.
+    """
+    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db.json")
+    try:
+        with open(db_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None, None, None
+    name = os.path.basename(input_file)
+    for item in data.get('list', []):
+        if item.get('filename') != name:
+            continue
+        trim_start = item.get('trimStartInSeconds')
+        trim_end = item.get('trimEndInSeconds')
+        gain_db = None
+        loudness = item.get('loudnessLUFS')
+        if loudness is not None:
+            gain_db = LOUDNESS_TARGET_LUFS - loudness
+            peak = item.get('peakDBFS')
+            if peak is not None:
+                # Never push the sample peak above the ceiling
+                gain_db = min(gain_db, PEAK_CEILING_DB - peak)
+        return trim_start, trim_end, gain_db
+    return None, None, None
+
+def get_duration(input_file):
+    """Get video duration in seconds (ffprobe, then OpenCV), or None."""
     try:
         result = subprocess.run(
             ["ffprobe", "-v", "error", "-show_entries", "format=duration",
@@ -34,31 +89,77 @@ def compress_with_ffmpeg(input_file, output_file, target_size_mb=5):
             timeout=30
         )
         if result.returncode == 0 and result.stdout.strip():
-            duration = float(result.stdout.strip())
+            return float(result.stdout.strip())
     except Exception:
         pass
-    if duration is None:
-        duration = get_duration_opencv(input_file)
+    return get_duration_opencv(input_file)
+
+def _trim_window(duration, trim_start=None, trim_end=None):
+    """Return (start, end) in source seconds of the part to encode."""
+    start = trim_start or 0.0
+    end = trim_end if trim_end is not None and trim_end < duration else duration
+    return start, end
+
+def compress_with_ffmpeg(input_file, output_file, target_size_mb=5, trim_start=None, trim_end=None, gain_db=None, crf=None, chunked=False):
+    """
+    Compress video using ffmpeg to target size.
+    trim_start/trim_end (seconds) cut the clip and gain_db applies a static
+    audio gain, all in the same encode. With crf, encode at that CRF
+    (as chosen by predict_crf) instead of an average bitrate. With chunked,
+    encode keyframe-split chunks in parallel (chunked_encode.encode_chunked).
+    """
+    duration = get_duration(input_file)
     if duration is None:
         print("Could not get video duration (need ffprobe or OpenCV)")
         return False
 
-    # Calculate target bitrate (in kbps)
-    target_bitrate_kbps = int((target_size_mb * 8 * 1024) / duration * 0.9)
-    video_bitrate = max(target_bitrate_kbps - 128, 500)
+    source_duration = duration
+    start, end = _trim_window(duration, trim_start, trim_end)
+    trim_args = []
+    if trim_start:
+        trim_args += ["-ss", f"{start:.3f}"]
+    if end < duration:
+        trim_args += ["-to", f"{end:.3f}"]
+    duration = end - start
+    if duration <= 0:
+        print("Trim points leave nothing to encode")
+        return False
+    audio_filter = []
+    if gain_db is not None and abs(gain_db) >= 0.1:
+        audio_filter = ["-af", f"volume={gain_db:.1f}dB"]
+        print(f"Audio gain: {gain_db:+.1f}dB (target {LOUDNESS_TARGET_LUFS} LUFS)")
+
+    if crf is not None:
+        video_args = ["-crf", f"{crf:.1f}"]
+        print(f"Target size: {target_size_mb}MB, Duration: {duration:.1f}s, CRF: {crf:.1f}")
+    else:
+        # Calculate target bitrate (in kbps)
+        target_bitrate_kbps = int((target_size_mb * 8 * 1024) / duration * 0.9)
+        video_bitrate = max(target_bitrate_kbps - 128, 500)
+        video_args = ["-b:v", f"{video_bitrate}k",
+                      "-maxrate", f"{video_bitrate}k",
+                      "-bufsize", f"{video_bitrate * 2}k"]
+
+        print(f"Target size: {target_size_mb}MB, Duration: {duration:.1f}s")
+        print(f"Target bitrate: {target_bitrate_kbps}kbps (video: {video_bitrate}kbps, audio: 128kbps)")
 
-    print(f"Target size: {target_size_mb}MB, Duration: {duration:.1f}s")
-    print(f"Target bitrate: {target_bitrate_kbps}kbps (video: {video_bitrate}kbps, audio: 128kbps)")
+    if chunked:
+        from chunked_encode import encode_chunked
+        result = encode_chunked(input_file, output_file,
+                                ["-c:v", "libx264"] + video_args,
+                                ["-c:a", "aac", "-b:a", "128k"] + audio_filter,
+                                start=start, end=end, duration=source_duration)
+        if result is None:
+            return False
+        print(f"Encoded {result['chunks']} chunk(s) in parallel in {result['seconds']:.1f}s")
+        return True
 
     try:
         subprocess.run(
-            ["ffmpeg", "-i", input_file,
-             "-c:v", "libx264",
-             "-b:v", f"{video_bitrate}k",
-             "-maxrate", f"{video_bitrate}k",
-             "-bufsize", f"{video_bitrate * 2}k",
+            ["ffmpeg"] + trim_args + ["-i", input_file,
+             "-c:v", "libx264"] + video_args + [
              "-c:a", "aac",
-             "-b:a", "128k",
+             "-b:a", "128k"] + audio_filter + [
              "-movflags", "+faststart",
              "-y", output_file],
             check=True,
@@ -72,22 +173,241 @@ def compress_with_ffmpeg(input_file, output_file, target_size_mb=5):
         print("ffmpeg not found. Install with: brew install ffmpeg")
         return False
 
+# ---- Sample-segment rate control ------------------------------------------
+# A few short segments are encoded in parallel at each candidate CRF; their
+# bitrate and SSIM (vs the source, on downscaled grayscale frames) predict the
+# CRF that meets both the size budget and the quality floor before the single
+# final encode.
+
+CANDIDATE_CRFS = [18, 22, 26, 30, 34]
+SAMPLE_SEGMENTS = 4
+SAMPLE_SECONDS = 3.0
+MIN_SSIM = 0.95
+AUDIO_KBPS = 128
+SSIM_SIZE = (320, 180)      # frames are compared at this size
+SSIM_FPS = 4                # frames per second sampled for SSIM
+SSIM_WINDOW = 8             # SSIM window (pixels)
+CONTAINER_OVERHEAD = 0.98   # fraction of the budget available to audio+video streams
+
+def sample_starts(start, end, count=SAMPLE_SEGMENTS, seconds=SAMPLE_SECONDS):
+    """Evenly spaced segment start times inside [start, end)."""
+    length = end - start
+    if length <= seconds * count:
+        # Short clip: sample it whole, once
+        return [start], length
+    step = length / count
+    return [start + step * (i + 0.5) - seconds / 2 for i in range(count)], seconds
+
+def _gray_frames(path, start, seconds):
+    """Decode [start, start+seconds) of path to an (n, h, w) uint8 array of downscaled gray frames."""
+    import numpy as np
+    w, h = SSIM_SIZE
+    r = subprocess.run(
+        ["ffmpeg", "-v", "error", "-ss", f"{start:.3f}", "-i", path, "-t", f"{seconds:.3f}",
+         "-vf", f"fps={SSIM_FPS},scale={w}:{h},format=gray", "-f", "rawvideo", "-"],
+        capture_output=True, timeout=120,
+    )
+    if r.returncode != 0:
+        return None
+    n = len(r.stdout) // (w * h)
+    return np.frombuffer(r.stdout, dtype=np.uint8, count=n * w * h).reshape(n, h, w)
+
+def ssim(a, b):
+    """
+    Mean SSIM over all frames of two (n, h, w) uint8 stacks, vectorized:
+    local means/variances come from integral images over SSIM_WINDOW boxes.
+    """
+    import numpy as np
+    n = min(len(a), len(b))
+    if n == 0:
+        return None
+    x = a[:n].astype(np.float64)
+    y = b[:n].astype(np.float64)
+    k = SSIM_WINDOW
+
+    def box_mean(z):
+        c = np.zeros((z.shape[0], z.shape[1] + 1, z.shape[2] + 1))
+        c[:, 1:, 1:] = z.cumsum(axis=1).cumsum(axis=2)
+        return (c[:, k:, k:] - c[:, :-k, k:] - c[:, k:, :-k] + c[:, :-k, :-k]) / (k * k)
+
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    mx, my = box_mean(x), box_mean(y)
+    vx = box_mean(x * x) - mx * mx
+    vy = box_mean(y * y) - my * my
+    cxy = box_mean(x * y) - mx * my
+    s = ((2 * mx * my + c1) * (2 * cxy + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(s.mean())
+
+def _encode_sample(input_file, start, seconds, crf, out):
+    """Encode one video-only sample segment at crf; return its size in bytes or None."""
+    r = subprocess.run(
+        ["ffmpeg", "-v", "error", "-ss", f"{start:.3f}", "-i", input_file, "-t", f"{seconds:.3f}",
+         "-an", "-c:v", "libx264", "-crf", str(crf), "-threads", "2", "-y", out],
+        capture_output=True, timeout=300,
+    )
+    return os.path.getsize(out) if r.returncode == 0 and os.path.exists(out) else None
+
+def predict_crf(input_file, target_size_mb, min_ssim=MIN_SSIM, trim_start=None, trim_end=None, workers=None):
+    """
+    Encode sample segments at CANDIDATE_CRFS in parallel and predict the CRF for
+    the final encode. Returns a dict (crf, predicted_mb, predicted_ssim, samples,
+    starts, seconds, met_size, met_quality) or None if sampling failed.
+    """
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    import numpy as np
+
+    duration = get_duration(input_file)
+    if duration is None:
+        print("Could not get video duration (need ffprobe or OpenCV)")
+        return None
+    start, end = _trim_window(duration, trim_start, trim_end)
+    starts, seconds = sample_starts(start, end)
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = [(crf, i, t) for crf in CANDIDATE_CRFS for i, t in enumerate(starts)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            sources = list(pool.map(lambda t: _gray_frames(input_file, t, seconds), starts))
+            sizes = list(pool.map(
+                lambda j: _encode_sample(input_file, j[2], seconds, j[0], os.path.join(tmp, f"crf{j[0]}_{j[1]}.mp4")),
+                jobs))
+            ssims = list(pool.map(
+                lambda j: ssim(sources[j[1]], _gray_frames(os.path.join(tmp, f"crf{j[0]}_{j[1]}.mp4"), 0, seconds))
+                if sources[j[1]] is not None and os.path.exists(os.path.join(tmp, f"crf{j[0]}_{j[1]}.mp4")) else None,
+                jobs))
+
+    samples = []
+    for crf in CANDIDATE_CRFS:
+        idx = [n for n, j in enumerate(jobs) if j[0] == crf]
+        seg_sizes = [sizes[n] for n in idx if sizes[n] is not None]
+        seg_ssims = [ssims[n] for n in idx if ssims[n] is not None]
+        if len(seg_sizes) != len(idx) or not seg_ssims:
+            continue
+        kbps = sum(seg_sizes) * 8 / 1024 / (seconds * len(idx))
+        samples.append({"crf": crf, "video_kbps": kbps, "ssim": float(np.mean(seg_ssims))})
+    if len(samples) < 2:
+        print("Sample encodes failed; cannot predict")
+        return None
+
+    crfs = np.array([x["crf"] for x in samples], dtype=float)
+    log_kbps = np.log([x["video_kbps"] for x in samples])
+    quality = np.array([x["ssim"] for x in samples])
+    length = end - start
+    budget_kbps = target_size_mb * 8 * 1024 * CONTAINER_OVERHEAD / length - AUDIO_KBPS
+
+    # Bitrate falls roughly exponentially with CRF: interpolate log(kbps) over CRF
+    lo, hi = crfs[0], crfs[-1]
+    if budget_kbps <= 0:
+        crf_size = hi
+    else:
+        crf_size = float(np.interp(np.log(budget_kbps), log_kbps[::-1], crfs[::-1]))
+        if np.log(budget_kbps) < log_kbps[-1]:
+            # Below the cheapest candidate: extrapolate along the last segment
+            slope = (log_kbps[-1] - log_kbps[-2]) / (crfs[-1] - crfs[-2])
+            crf_size = min(51.0, hi + (np.log(budget_kbps) - log_kbps[-1]) / slope)
+    # Highest CRF (smallest file) that still reaches the quality floor
+    if quality[-1] >= min_ssim:
+        crf_quality = hi
+    elif quality[0] < min_ssim:
+        crf_quality = lo
+    else:
+        crf_quality = float(np.interp(min_ssim, quality[::-1], crfs[::-1]))
+
+    crf = max(crf_size, crf_quality)
+    predicted_kbps = float(np.exp(np.interp(crf, crfs, log_kbps)))
+    return {
+        "crf": round(crf, 1),
+        "predicted_mb": (predicted_kbps + AUDIO_KBPS) * length / 8 / 1024 / CONTAINER_OVERHEAD,
+        "predicted_ssim": float(np.interp(crf, crfs, quality)),
+        "met_quality": bool(np.interp(crf, crfs, quality) >= min_ssim),
+        "samples": samples,
+        "starts": starts,
+        "seconds": seconds,
+    }
+
+def measure_output_ssim(input_file, output_file, starts, seconds, trim_start=None):
+    """SSIM of the final output vs the source at the sample positions."""
+    offset = trim_start or 0.0
+    values = []
+    for t in starts:
+        src = _gray_frames(input_file, t, seconds)
+        out = _gray_frames(output_file, t - offset, seconds)
+        if src is not None and out is not None:
+            v = ssim(src, out)
+            if v is not None:
+                values.append(v)
+    return sum(values) / len(values) if values else None
+
+def compress_with_prediction(input_file, output_file, target_size_mb=5, min_ssim=MIN_SSIM, trim_start=None, trim_end=None, gain_db=None, chunked=False):
+    """Predict the CRF from sample segments, encode once, and report size error and SSIM."""
+    prediction = predict_crf(input_file, target_size_mb, min_ssim, trim_start, trim_end)
+    if prediction is None:
+        return False
+    for x in prediction["samples"]:
+        print(f"  sample CRF {x['crf']}: video {x['video_kbps']:.0f}kbps, SSIM {x['ssim']:.4f}")
+    print(f"Predicted CRF {prediction['crf']}: {prediction['predicted_mb']:.2f}MB, SSIM {prediction['predicted_ssim']:.4f}")
+    if not prediction["met_quality"]:
+        print(f"  Warning: size budget forces SSIM below the {min_ssim} floor")
+    if not compress_with_ffmpeg(input_file, output_file, target_size_mb, trim_start, trim_end, gain_db, crf=prediction["crf"], chunked=chunked):
+        return False
+    size_mb = os.path.getsize(output_file) / (1024 * 1024)
+    error = (size_mb - prediction["predicted_mb"]) / prediction["predicted_mb"] * 100
+    final_ssim = measure_output_ssim(input_file, output_file, prediction["starts"], prediction["seconds"], trim_start)
+    print(f"Final size {size_mb:.2f}MB (target {target_size_mb}MB, prediction error {error:+.1f}%), "
+          f"SSIM {final_ssim:.4f}" if final_ssim is not None else f"Final size {size_mb:.2f}MB, SSIM n/a")
+    return True
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 compress_video.py <input_file> [output_file] [target_size_mb]")
-        sys.exit(1)
+    ap = argparse.ArgumentParser(description="Compress video file to target size.")
+    ap.add_argument("input_file")
+    ap.add_argument("output_file", nargs="?")
+    ap.add_argument("target_size_mb", nargs="?", type=float, default=5.0)
+    ap.add_argument("--trim-normalize", action="store_true",
+                    help="Apply trim points and loudness from db.json (see analyze_audio.py).")
+    ap.add_argument("--predict", action="store_true",
+                    help="Pick CRF from parallel sample-segment encodes instead of one average bitrate.")
+    ap.add_argument("--min-ssim", type=float, default=MIN_SSIM, help=f"Quality floor for --predict (default {MIN_SSIM}).")
+    ap.add_argument("--chunked", action="store_true",
+                    help="Encode keyframe-split chunks in parallel (for long videos).")
+    ap.add_argument("--resume", action="store_true",
+                    help="Skip the encode if the job journal shows this output is already done.")
+    args = ap.parse_args()
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else input_file.replace(".m4v", "_compressed.m4v").replace(".MP4", "_compressed.MP4").replace(".mp4", "_compressed.mp4")
-    target_size_mb = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+    input_file = args.input_file
+    output_file = args.output_file or input_file.replace(".m4v", "_compressed.m4v").replace(".MP4", "_compressed.MP4").replace(".mp4", "_compressed.mp4")
+    target_size_mb = args.target_size_mb
     
     if not os.path.exists(input_file):
         print(f"Error: File not found: {input_file}")
         sys.exit(1)
     
+    journal = JobJournal("compress_video")
+    job_key = os.path.abspath(output_file)
+    job_params = {"targetSizeMB": target_size_mb, "trimNormalize": args.trim_normalize,
+                  "predict": args.predict, "minSSIM": args.min_ssim if args.predict else None}
+    if args.resume and journal.up_to_date(job_key, output_file, input_file, job_params):
+        print(f"✓ Already done (job journal): {output_file}")
+        return
+
     print(f"Compressing {input_file} to {output_file} (target: {target_size_mb}MB)...")
     
-    if compress_with_ffmpeg(input_file, output_file, target_size_mb):
+    trim_start, trim_end, gain_db = None, None, None
+    if args.trim_normalize:
+        trim_start, trim_end, gain_db = load_audio_settings(input_file)
+        if trim_start is None and gain_db is None:
+            print("No audio analysis in db.json for this file (run analyze_audio.py first); encoding as is")
+        else:
+            print(f"Trim: {trim_start}s - {trim_end}s")
+    
+    def encode(tmp_output):
+        if args.predict:
+            return compress_with_prediction(input_file, tmp_output, target_size_mb, args.min_ssim, trim_start, trim_end, gain_db, args.chunked)
+        return compress_with_ffmpeg(input_file, tmp_output, target_size_mb, trim_start, trim_end, gain_db, chunked=args.chunked)
+
+    ok = journal.run(job_key, input_file, output_file, encode, job_params)
+    if ok:
         size_mb = os.path.getsize(output_file) / (1024 * 1024)
         print(f"✓ Success! Output file: {output_file} ({size_mb:.2f}MB)")
     else:
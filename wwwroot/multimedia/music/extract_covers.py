@@ -2,14 +2,27 @@
 """
 Extract the first frame of each MP4 in videos/ and save as covers_generated/xxx_cover.png.
 Crops to 640x360 (16:9 aspect ratio) - takes center portion to match content frame size.
-Uses ffmpeg if available, otherwise OpenCV (cv2). For OpenCV: pip install opencv-python-headless
+Uses ffmpeg if available, otherwise OpenCV (cv2) through the shared frame cache
+(../frame_cache.py), so the opening is decoded once per video. For OpenCV: pip install opencv-python-headless
+
+Covers are written through the job journal (../job_journal.py); with --resume,
+covers already extracted from the unchanged video are skipped.
+
+With --hashed-names, covers are also published as xxx_cover.<hash8>.webp and
+recorded in db.json as "cover" (see ../cover_names.py).
 """
+import argparse
 import json
 import os
 import shutil
 import subprocess
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # shared frame_cache.py, job_journal.py, cover_names.py
+
+from cover_names import GC_GRACE_DAYS, hashed_names_enabled, publish_all
+from job_journal import JobJournal
+
 # Cover size: 640x360 (16:9 aspect ratio) to match content frame size
 COVER_WIDTH = 640
 COVER_HEIGHT = 360
@@ -58,12 +71,11 @@ def extract_with_ffmpeg(mp4: str, out: str, width: int = 640, height: int = 360,
 def extract_with_opencv(mp4: str, out: str, width: int = 640, height: int = 360, offset_y: int = 0) -> bool:
     try:
         import cv2
+        from frame_cache import default_cache
     except ImportError:
         return False
-    cap = cv2.VideoCapture(mp4)
-    ok, frame = cap.read()
-    cap.release()
-    if not ok or frame is None:
+    frame = default_cache().first_frame(mp4)
+    if frame is None:
         return False
     # Crop portion of frame to match cover size, with vertical offset upward
     h, w = frame.shape[:2]
@@ -83,6 +95,11 @@ def extract_with_opencv(mp4: str, out: str, width: int = 640, height: int = 360,
     cropped = frame[start_y:start_y + height, start_x:start_x + width]
     return cv2.imwrite(out, cropped)
 
+def extract_cover(mp4: str, out: str, width: int = 640, height: int = 360, offset_y: int = 0) -> bool:
+    """ffmpeg first (as before the frame cache, so existing covers do not change), cached OpenCV frame as fallback."""
+    return ((has_ffmpeg() and extract_with_ffmpeg(mp4, out, width, height, offset_y))
+            or extract_with_opencv(mp4, out, width, height, offset_y))
+
 def _has_opencv():
     try:
         import cv2
@@ -91,6 +108,13 @@ def _has_opencv():
         return False
 
 def main():
+    ap = argparse.ArgumentParser(description="Extract covers for videos/ into covers_generated/.")
+    ap.add_argument("--resume", action="store_true", help="Skip covers the job journal shows are up to date.")
+    ap.add_argument("--hashed-names", action="store_true",
+                    help="Also publish content-hashed covers and record them in db.json (stays on once recorded).")
+    ap.add_argument("--gc-grace-days", type=float, default=GC_GRACE_DAYS,
+                    help=f"Delete superseded hashed covers after this many days (default {GC_GRACE_DAYS}).")
+    args = ap.parse_args()
     if not has_ffmpeg() and not _has_opencv():
         print("Neither ffmpeg nor OpenCV (cv2) is available.")
         print("Install one of them:")
@@ -101,6 +125,7 @@ def main():
     video_dir = os.path.join(script_dir, "videos")
     out_dir = os.path.join(script_dir, "covers_generated")
     os.makedirs(out_dir, exist_ok=True)
+    journal = JobJournal("extract_covers-music")
     if not os.path.isdir(video_dir):
         print("No videos/ folder found.")
         return
@@ -113,22 +138,26 @@ def main():
     if not mp4_files:
         print("No .mp4 files found in videos/.")
         return
+    plain_covers = {}
     for mp4 in sorted(mp4_files):
         base, _ = os.path.splitext(mp4)
         mp4_path = os.path.join(video_dir, mp4)
         out_path = os.path.join(out_dir, base + "_cover.png")
+        plain_covers[mp4] = out_path
         # Get cover offset for this video (default to 0 if not found)
         offset_y = cover_offsets.get(mp4, 0)
         print(f"Extracting: {mp4} (offset: {offset_y}px up) -> {out_path}")
-        ok = False
-        if has_ffmpeg():
-            ok = extract_with_ffmpeg(mp4_path, out_path, COVER_WIDTH, COVER_HEIGHT, offset_y)
-        if not ok:
-            ok = extract_with_opencv(mp4_path, out_path, COVER_WIDTH, COVER_HEIGHT, offset_y)
+        if args.resume and journal.up_to_date(mp4, out_path, mp4_path, params={"offset": offset_y}):
+            print("  up to date (job journal), skipping")
+            continue
+        ok = journal.run(mp4, mp4_path, out_path, lambda tmp: extract_cover(mp4_path, tmp, COVER_WIDTH, COVER_HEIGHT, offset_y), {"offset": offset_y})
         if not ok:
             print("  FAILED")
         else:
             print("  OK")
+    db_path = os.path.join(script_dir, "db.json")
+    if hashed_names_enabled(db_path, args.hashed_names):
+        publish_all(db_path, out_dir, plain_covers, args.gc_grace_days)
     print("Done.")
 
 if __name__ == "__main__":
@@ -2,65 +2,182 @@
 """
 Generate square thumbnails (covers) for each image in images/ and save as covers_generated/xxx_cover.png.
 Uses PIL/Pillow for image processing. Install with: pip install Pillow
+
+Large images are decoded with bounded memory:
+- JPEGs use draft mode, so the decoder itself scales down by up to 8x;
+- the square is cut out and integer-downscaled with Image.reduce in small
+  strips before any mode conversion, so only the small square is composited;
+- every decode reserves its estimated size from a shared MemoryBudget, so
+  covers generated in parallel never exceed --memory-budget-mb together;
+  an image larger than the whole budget waits until no other decode is
+  running and is then decoded alone.
+
+tests/test_generate_covers.py checks the budget and the peak RSS on synthetic
+large JPEG/PNG images.
+
+Covers are written through the job journal (../job_journal.py), so an
+interrupted run leaves no half-written PNG; with --resume, covers the journal
+shows were generated from the unchanged image are skipped.
+
+With --hashed-names, covers are also published as xxx_cover.<hash8>.webp and
+recorded in db.json as "cover" (see ../cover_names.py).
 """
+import argparse
+import math
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
-def generate_cover(image_path: str, out_path: str, size: int = 250) -> bool:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # shared job_journal.py, cover_names.py
+
+from cover_names import GC_GRACE_DAYS, hashed_names_enabled, publish_all
+from job_journal import JobJournal
+
+# Default budget for decoded pixel data across all parallel cover jobs (MB)
+MEMORY_BUDGET_MB = 256
+
+# Modes Image.reduce() handles directly; others are converted after cropping
+REDUCIBLE_MODES = {'L', 'LA', 'RGB', 'RGBA', 'CMYK', 'I', 'F'}
+# Source pixels per strip when reducing large images (~4MB for RGBA)
+REDUCE_STRIP_PIXELS = 1_000_000
+
+class MemoryBudget:
+    """Shared budget (MB) of decoded image memory; acquire() blocks until it fits."""
+
+    def __init__(self, total_mb: float = MEMORY_BUDGET_MB):
+        self.total_mb = total_mb
+        self._used_mb = 0.0
+        self._oversize_waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, mb: float) -> None:
+        """
+        Reserve mb, waiting until it fits. A reservation larger than the whole
+        budget waits until nothing else is reserved and then runs alone; other
+        reservations do not start while one is waiting, so it is not starved.
+        """
+        oversize = mb > self.total_mb
+        with self._cond:
+            self._oversize_waiting += oversize
+            try:
+                while ((self._used_mb and self._used_mb + mb > self.total_mb)
+                       or (not oversize and self._oversize_waiting)):
+                    self._cond.wait()
+            finally:
+                self._oversize_waiting -= oversize
+            self._used_mb += mb
+
+    def release(self, mb: float) -> None:
+        with self._cond:
+            self._used_mb -= mb
+            self._cond.notify_all()
+
+def _decoded_mb(img) -> float:
+    """Estimated memory of the fully decoded image in MB."""
+    bytes_per_pixel = {'1': 1, 'P': 1, 'L': 1, 'I;16': 2, 'LA': 4, 'I': 4, 'F': 4}.get(img.mode, 4)
+    return img.width * img.height * bytes_per_pixel / (1024 * 1024)
+
+def _square_box(width: int, height: int) -> tuple:
+    """Center square crop box (left, top, right, bottom)."""
+    if width > height:
+        # Landscape: crop width
+        left = (width - height) // 2
+        return (left, 0, left + height, height)
+    # Portrait or square: crop height
+    top = (height - width) // 2
+    return (0, top, width, top + width)
+
+def _reduce_box(img, factor: int, box: tuple):
+    """
+    Image.reduce(factor, box=box) done in horizontal strips. Image.reduce()
+    premultiplies alpha by converting the *whole* image first, which would
+    double peak memory for large RGBA/LA images; strips keep the copy small.
+    """
+    left, top, right, bottom = box
+    out_w, out_h = (right - left) // factor, (bottom - top) // factor
+    out = Image.new(img.mode, (out_w, out_h))
+    rows = max(1, REDUCE_STRIP_PIXELS // (out_w * factor * factor))
+    for y in range(0, out_h, rows):
+        n = min(rows, out_h - y)
+        strip = img.crop((left, top + y * factor, left + out_w * factor, top + (y + n) * factor))
+        out.paste(strip.reduce(factor), (0, y))
+    return out
+
+def generate_cover(image_path: str, out_path: str, size: int = 250, budget: MemoryBudget = None) -> bool:
     """
     Generate a square thumbnail cover from an image.
     Args:
         image_path: Path to the source image
         out_path: Path to save the cover
         size: Size of the square thumbnail (default 250x250)
+        budget: Shared MemoryBudget; an image larger than it is decoded alone
     Returns:
         True if successful, False otherwise
     """
+    reserved = 0.0
     try:
-        # Open the image
-        img = Image.open(image_path)
-        
-        # Convert to RGB if necessary (handles RGBA, P mode, etc.)
-        if img.mode in ('RGBA', 'LA', 'P'):
+        # Open the image (header only, nothing decoded yet)
+        with Image.open(image_path) as img:
+            if img.format == 'JPEG' and img.mode in ('RGB', 'L', 'CMYK'):
+                # Let the JPEG decoder scale by 1/2..1/8 while keeping the square >= size
+                scale = size / min(img.size)
+                img.draft(img.mode, (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+
+            if budget is not None:
+                reserved = _decoded_mb(img)
+                if reserved > budget.total_mb:
+                    print(f"  {image_path} needs ~{reserved:.0f}MB, budget is {budget.total_mb:.0f}MB: "
+                          f"decoding it alone")
+                budget.acquire(reserved)
+
+            # Crop to square before any conversion, and integer-downscale in the same step
+            box = _square_box(*img.size)
+            factor = max(1, (box[2] - box[0]) // size)
+            if img.mode in REDUCIBLE_MODES:
+                img = _reduce_box(img, factor, box) if factor > 1 else img.crop(box)
+            else:
+                # P / 1 / I;16: crop in the compact native mode, convert only the square
+                img = img.crop(box)
+                img = img.convert('RGBA' if img.mode == 'P' else 'RGB')
+                if factor > 1:
+                    img = img.reduce(factor)
+
+        # Convert to RGB if necessary (handles RGBA, LA, etc.) on the small square only
+        if img.mode in ('RGBA', 'LA'):
             # Create a white background for transparent images
             background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            background.paste(img, mask=img.getchannel('A'))
             img = background
         elif img.mode != 'RGB':
             img = img.convert('RGB')
-        
-        # Calculate crop to make it square (center crop)
-        width, height = img.size
-        if width > height:
-            # Landscape: crop width
-            left = (width - height) // 2
-            right = left + height
-            top = 0
-            bottom = height
-        else:
-            # Portrait or square: crop height
-            top = (height - width) // 2
-            bottom = top + width
-            left = 0
-            right = width
-        
-        # Crop to square
-        img = img.crop((left, top, right, bottom))
-        
+
         # Resize to target size
         img = img.resize((size, size), Image.Resampling.LANCZOS)
-        
+
         # Save as PNG
         img.save(out_path, 'PNG', optimize=True)
         return True
     except Exception as e:
         print(f"  Error processing {image_path}: {e}")
         return False
+    finally:
+        if reserved:
+            budget.release(reserved)
 
 def main():
+    ap = argparse.ArgumentParser(description="Generate square covers for images/.")
+    ap.add_argument("--memory-budget-mb", type=float, default=MEMORY_BUDGET_MB,
+                    help=f"Decoded image memory allowed across all workers (default {MEMORY_BUDGET_MB}).")
+    ap.add_argument("--workers", type=int, default=1, help="Covers generated in parallel (default 1).")
+    ap.add_argument("--resume", action="store_true", help="Skip covers the job journal shows are up to date.")
+    ap.add_argument("--hashed-names", action="store_true",
+                    help="Also publish content-hashed covers and record them in db.json (stays on once recorded).")
+    ap.add_argument("--gc-grace-days", type=float, default=GC_GRACE_DAYS,
+                    help=f"Delete superseded hashed covers after this many days (default {GC_GRACE_DAYS}).")
+    args = ap.parse_args()
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
     images_dir = os.path.join(script_dir, "images")
     out_dir = os.path.join(script_dir, "covers_generated")
@@ -95,19 +212,26 @@ def main():
     
     print(f"Found {len(image_files)} images. Generating covers...")
     
+    budget = MemoryBudget(args.memory_budget_mb)
+    journal = JobJournal("generate_covers-paintings")
+    db_path = os.path.join(script_dir, "db.json")
+    plain_covers = {}
+    jobs = []
     for img_file in sorted(image_files):
         base, ext = os.path.splitext(img_file)
         img_path = os.path.join(images_dir, img_file)
         out_path = os.path.join(out_dir, base + "_cover.png")
+        plain_covers[img_file] = out_path
         
+        if args.resume and journal.up_to_date(img_file, out_path, img_path):
+            print(f"Skipping {img_file} (up to date in job journal)")
+            continue
         # Skip if cover already exists and is newer than source
         if os.path.exists(out_path):
             if os.path.getmtime(out_path) >= os.path.getmtime(img_path):
                 print(f"Skipping {img_file} (cover already up to date)")
                 continue
         
-        print(f"Generating cover: {img_file} -> {os.path.basename(out_path)}")
-        
         # Handle HEIC files (may need special handling)
         if ext.lower() in ['.heic', '.heif']:
             # Try to use pillow-heif if available
@@ -119,11 +243,18 @@ def main():
                 print(f"  Skipping {img_file}")
                 continue
         
-        ok = generate_cover(img_path, out_path)
-        if ok:
-            print(f"  OK")
-        else:
-            print(f"  FAILED")
+        jobs.append((img_file, img_path, out_path))
+    
+    def run(job):
+        img_file, img_path, out_path = job
+        ok = journal.run(img_file, img_path, out_path, lambda tmp: generate_cover(img_path, tmp, budget=budget))
+        print(f"Generating cover: {img_file} -> {os.path.basename(out_path)}  {'OK' if ok else 'FAILED'}")
+    
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        list(pool.map(run, jobs))
+    
+    if hashed_names_enabled(db_path, args.hashed_names):
+        publish_all(db_path, out_dir, plain_covers, args.gc_grace_days)
     
     print("Done.")
 